@@ -1,23 +1,55 @@
 # main.py - LivestockSync Admin Backend with Firebase Integration & Real-time Dashboard
 
-from fastapi import FastAPI, HTTPException, Depends, status, WebSocket, WebSocketDisconnect, Body
+from fastapi import FastAPI, HTTPException, Depends, status, WebSocket, WebSocketDisconnect, Body, Query, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr, validator, Field
-from typing import Optional, List, Dict, Any, Union
-from datetime import datetime, timedelta
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.datastructures import Headers, MutableHeaders
+from pydantic import BaseModel, ConfigDict, EmailStr, validator, Field, ValidationError
+from pydantic_core import to_json
+from typing import Optional, List, Dict, Any, Union, Callable, Iterator, AsyncIterator
+from datetime import datetime, timedelta, timezone
 from enum import Enum
 from jose import jwt, JWTError
 import uuid
 import re
+import sys
 import uvicorn
 import firebase_admin
 from firebase_admin import credentials, firestore
+from google.cloud.firestore_v1.field_path import FieldPath
 import os
 from pathlib import Path
 import asyncio
+import base64
+import bisect
+import codecs
+import csv
+import gzip
+import io
+import functools
+import hashlib
+import heapq
+import itertools
 import json
+import math
 import random
+import sqlite3
+import threading
+import time
+import zlib
+from collections import deque, namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+except ImportError:  # optional: pydantic-core's encoder is used instead
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional: responses fall back to gzip
+    brotli = None
 
 # =============================
 # FIREBASE CONFIGURATION
@@ -74,10 +106,47 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440
 MAX_ADMINS = 1
 
+# =============================
+# RESPONSE SERIALIZATION
+# =============================
+
+def _encode_default(value):
+    # orjson only knows exact datetimes; Firestore returns DatetimeWithNanoseconds
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def encode_json(content: Any) -> bytes:
+    """Compiled JSON encoding with native datetime support (orjson, else pydantic-core)"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_encode_default, option=orjson.OPT_NON_STR_KEYS)
+    return to_json(content, fallback=_encode_default)
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return encode_json(content)
+
+def json_response(content: Any, response: Response) -> FastJSONResponse:
+    """Serialize straight to bytes, skipping FastAPI's jsonable_encoder pass.
+
+    Returning a Response bypasses the headers FastAPI would merge from the
+    injected one (e.g. the ETag), so they are copied over here.
+    """
+    fast = FastJSONResponse(content)
+    for key, value in response.headers.items():
+        if key not in ("content-length", "content-type"):
+            fast.headers[key] = value
+    return fast
+
 app = FastAPI(
     title="LivestockSync Admin API", 
     version="5.0.0",
-    description="Complete Admin Dashboard Backend with Firebase Integration"
+    description="Complete Admin Dashboard Backend with Firebase Integration",
+    default_response_class=FastJSONResponse
 )
 
 # CORS Configuration
@@ -91,6 +160,931 @@ app.add_middleware(
 
 security = HTTPBearer()
 
+# =============================
+# RESPONSE COMPRESSION
+# =============================
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))  # low quality keeps dynamic responses cheap
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header, honouring q=0"""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    wildcard = accepted.get("*", 0.0)
+    for encoding in (["br"] if brotli else []) + ["gzip"]:
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+class _Compressor:
+    """Same streaming interface over zlib (gzip framing) and brotli"""
+
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._brotli.process(data) if self._brotli else self._zlib.compress(data)
+
+    def finish(self) -> bytes:
+        return self._brotli.finish() if self._brotli else self._zlib.flush()
+
+class CompressionStats:
+    """Per-route compression counters for /api/metrics"""
+
+    def __init__(self):
+        self.routes: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, route: str, encoding: Optional[str], bytes_in: int, bytes_out: int, seconds: float):
+        stats = self.routes.setdefault(route, {
+            "responses": 0, "compressed": 0, "bytes_in": 0, "bytes_out": 0, "compress_seconds": 0.0, "encodings": {}
+        })
+        stats["responses"] += 1
+        if encoding:
+            stats["compressed"] += 1
+            stats["bytes_in"] += bytes_in
+            stats["bytes_out"] += bytes_out
+            stats["compress_seconds"] += seconds
+            stats["encodings"][encoding] = stats["encodings"].get(encoding, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            route: {
+                "responses": stats["responses"],
+                "compressed": stats["compressed"],
+                "encodings": dict(stats["encodings"]),
+                "bytes_in": stats["bytes_in"],
+                "bytes_out": stats["bytes_out"],
+                "ratio": round(stats["bytes_in"] / stats["bytes_out"], 2) if stats["bytes_out"] else None,
+                "avg_compress_ms": round(stats["compress_seconds"] * 1000 / stats["compressed"], 3)
+                                   if stats["compressed"] else None,
+            }
+            for route, stats in self.routes.items()
+        }
+
+compression_stats = CompressionStats()
+
+class CompressionMiddleware:
+    """Negotiated brotli/gzip for HTTP responses.
+
+    Bodies sent in one piece are compressed only above minimum_size;
+    streamed bodies (more_body) are compressed chunk by chunk as they go.
+    Compressed responses get a weak ETag, since the bytes differ from the
+    identity representation the strong tag was computed for.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        
+        state = {"start": None, "compressor": None, "bytes_in": 0, "bytes_out": 0, "seconds": 0.0}
+        
+        def route_name() -> str:
+            route = scope.get("route")
+            return f"{scope['method']} {getattr(route, 'path', None) or '<unmatched>'}"
+        
+        def compress(data: bytes, last: bool) -> bytes:
+            started = time.perf_counter()
+            chunk = state["compressor"].compress(data)
+            if last:
+                chunk += state["compressor"].finish()
+            state["seconds"] += time.perf_counter() - started
+            state["bytes_in"] += len(data)
+            state["bytes_out"] += len(chunk)
+            return chunk
+        
+        async def compressing_send(message):
+            if message["type"] == "http.response.start":
+                state["start"] = message  # held until the first body chunk decides
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            start = state.pop("start", None)
+            if start is not None:
+                headers = MutableHeaders(raw=list(start["headers"]))
+                start["headers"] = headers.raw
+                content_type = headers.get("content-type", "")
+                eligible = (
+                    "content-encoding" not in headers
+                    and start["status"] not in (204, 304)
+                    and content_type.startswith(COMPRESSIBLE_TYPES)
+                    and (more_body or len(body) >= self.minimum_size)
+                )
+                if not eligible:
+                    compression_stats.record(route_name(), None, 0, 0, 0.0)
+                    await send(start)
+                    await send(message)
+                    return
+                
+                state["compressor"] = _Compressor(encoding)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = "W/" + etag
+                if more_body:
+                    del headers["Content-Length"]
+                    await send(start)
+                else:
+                    message = {**message, "body": compress(body, last=True)}
+                    headers["Content-Length"] = str(len(message["body"]))
+                    await send(start)
+                    await send(message)
+                    compression_stats.record(route_name(), encoding, state["bytes_in"], state["bytes_out"],
+                                             state["seconds"])
+                    return
+            elif state["compressor"] is None:
+                await send(message)  # passthrough response, later chunks
+                return
+            
+            await send({**message, "body": compress(body, last=not more_body)})
+            if not more_body:
+                compression_stats.record(route_name(), encoding, state["bytes_in"], state["bytes_out"],
+                                         state["seconds"])
+        
+        await self.app(scope, receive, compressing_send)
+
+app.add_middleware(CompressionMiddleware)
+
+# =============================
+# ASYNC DATABASE EXECUTOR
+# =============================
+
+# Storage backends are synchronous, so every call is offloaded to a bounded
+# thread pool instead of blocking the event loop for a network round trip.
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "16"))
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db-io")
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking database call on the bounded database executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, functools.partial(func, *args, **kwargs))
+
+@app.on_event("shutdown")
+async def shutdown_db_executor():
+    """Drain queued activity writes, then release the database worker threads"""
+    await activity_queue.drain()
+    db_executor.shutdown(wait=False)
+
+# =============================
+# STORAGE BACKENDS
+# =============================
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firestore").lower()  # "firestore" or "sqlite"
+SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", str(Path(__file__).parent.absolute() / "livestocksync.db"))
+
+COLLECTIONS = ("users", "hospitals", "slaughterhouses", "feedbacks", "activities", "user_settings", "tombstones")
+
+# kind is one of "set", "update", "delete" or "increment". Increment data is a
+# (possibly nested) dict whose numeric leaves are added to the stored values;
+# any other leaf is written as-is.
+WriteOp = namedtuple("WriteOp", ["kind", "collection", "doc_id", "data", "merge"])
+
+class StorageBackend:
+    """Document store interface shared by the Firestore and SQLite engines.
+
+    Documents are plain dicts keyed by id. Filters are (field, op, value)
+    tuples using Firestore operators. Methods are blocking; use the
+    Repository wrappers below from async code.
+    """
+
+    name = "base"
+
+    def get(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def set(self, collection: str, doc_id: str, data: Dict[str, Any], merge: bool = False):
+        raise NotImplementedError
+
+    def update(self, collection: str, doc_id: str, data: Dict[str, Any]):
+        raise NotImplementedError
+
+    def delete(self, collection: str, doc_id: str):
+        raise NotImplementedError
+
+    def query(self, collection: str, filters: Optional[List[tuple]] = None,
+              order_by: Optional[Union[str, List[str]]] = None, descending: bool = False,
+              limit: Optional[int] = None, start_after: Optional[List[Any]] = None,
+              fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """order_by is a field or list of fields sorted in the same direction;
+        "id" means the document id. start_after holds one value per order field.
+        fields projects each result down to those top-level fields."""
+        raise NotImplementedError
+
+    def stream(self, collection: str, filters: Optional[List[tuple]] = None,
+               order_by: Optional[Union[str, List[str]]] = None, descending: bool = False,
+               fields: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Like query() without a limit, but yields documents lazily so a
+        full-collection read never has to fit in memory"""
+        raise NotImplementedError
+
+    def count(self, collection: str, filters: Optional[List[tuple]] = None) -> int:
+        """Count matching documents without fetching them"""
+        raise NotImplementedError
+
+    def watch(self, collection: str, callback):
+        """Listen for changes: callback receives [(kind, doc_id, data)] batches
+        with kind "added", "modified" or "removed". Returns a handle with
+        unsubscribe()."""
+        raise NotImplementedError(f"{self.name} backend does not support listeners")
+
+    def commit(self, operations: List[WriteOp]):
+        """Apply a list of WriteOps atomically"""
+        raise NotImplementedError
+
+    def transact(self, reads: List[tuple], plan) -> List[Optional[Dict[str, Any]]]:
+        """Read (collection, doc_id) documents and commit the WriteOps
+        plan(docs) returns in the same transaction; returns the docs read.
+        plan may run more than once, so it must not have side effects."""
+        raise NotImplementedError
+
+class FirestoreBackend(StorageBackend):
+    """Storage backend on top of the Firebase Admin Firestore client"""
+
+    name = "firestore"
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, collection, doc_id):
+        doc = self.client.collection(collection).document(doc_id).get()
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        data["id"] = doc.id
+        return data
+
+    def set(self, collection, doc_id, data, merge=False):
+        self.client.collection(collection).document(doc_id).set(data, merge=merge)
+
+    def update(self, collection, doc_id, data):
+        self.client.collection(collection).document(doc_id).update(data)
+
+    def delete(self, collection, doc_id):
+        self.client.collection(collection).document(doc_id).delete()
+
+    def _filtered(self, collection, filters):
+        query = self.client.collection(collection)
+        for field, op, value in filters or []:
+            query = query.where(field, op, value)
+        return query
+
+    @staticmethod
+    def _field_path(field: str) -> str:
+        return FieldPath.document_id() if field == "id" else field
+
+    def _query(self, collection, filters=None, order_by=None, descending=False, limit=None, start_after=None,
+               fields=None):
+        query = self._filtered(collection, filters)
+        if fields:
+            # Projection happens server-side: unselected fields are never sent
+            query = query.select([field for field in fields if field != "id"])
+        order_fields = [order_by] if isinstance(order_by, str) else list(order_by or [])
+        direction = firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING
+        for field in order_fields:
+            query = query.order_by(self._field_path(field), direction=direction)
+        if start_after:
+            # Cursor seek on the index: deep pages cost the same as the first one
+            query = query.start_after({
+                self._field_path(field): value for field, value in zip(order_fields, start_after)
+            })
+        if limit:
+            query = query.limit(limit)
+        return query
+
+    def query(self, collection, filters=None, order_by=None, descending=False, limit=None, start_after=None,
+              fields=None):
+        return list(self.stream(collection, filters, order_by, descending, fields, limit, start_after))
+
+    def stream(self, collection, filters=None, order_by=None, descending=False, fields=None, limit=None,
+               start_after=None):
+        for doc in self._query(collection, filters, order_by, descending, limit, start_after, fields).stream():
+            data = doc.to_dict()
+            data["id"] = doc.id
+            yield data
+
+    def watch(self, collection, callback):
+        def on_snapshot(col_snapshot, changes, read_time):
+            callback([
+                (change.type.name.lower(), change.document.id, {**change.document.to_dict(), "id": change.document.id})
+                for change in changes
+            ])
+        return self.client.collection(collection).on_snapshot(on_snapshot)
+
+    def count(self, collection, filters=None):
+        # Server-side aggregation: billed per index entry batch, no documents transferred
+        results = self._filtered(collection, filters).count(alias="total").get()
+        return int(results[0][0].value)
+
+    @classmethod
+    def _increments(cls, deltas: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            key: cls._increments(value) if isinstance(value, dict)
+            else firestore.Increment(value) if isinstance(value, (int, float)) and not isinstance(value, bool)
+            else value
+            for key, value in deltas.items()
+        }
+
+    def _stage(self, writer, operations):
+        """Add WriteOps to a WriteBatch or Transaction"""
+        for op in operations:
+            ref = self.client.collection(op.collection).document(op.doc_id)
+            if op.kind == "set":
+                writer.set(ref, op.data, merge=op.merge)
+            elif op.kind == "update":
+                writer.update(ref, op.data)
+            elif op.kind == "delete":
+                writer.delete(ref)
+            elif op.kind == "increment":
+                writer.set(ref, self._increments(op.data), merge=True)
+            else:
+                raise ValueError(f"Unsupported write operation: {op.kind}")
+
+    def commit(self, operations):
+        batch = self.client.batch()
+        self._stage(batch, operations)
+        batch.commit()
+
+    def transact(self, reads, plan):
+        refs = [self.client.collection(collection).document(doc_id) for collection, doc_id in reads]
+
+        @firestore.transactional
+        def run(transaction):
+            docs = []
+            for ref in refs:
+                snapshot = ref.get(transaction=transaction)
+                docs.append({**snapshot.to_dict(), "id": snapshot.id} if snapshot.exists else None)
+            self._stage(transaction, plan(docs))
+            return docs
+
+        return run(self.client.transaction())
+
+class SQLiteBackend(StorageBackend):
+    """Local storage backend: one JSON document table per collection.
+
+    Frequently queried fields get expression indexes, so equality filters and
+    ordered reads on them never scan the table.
+    """
+
+    name = "sqlite"
+
+    INDEXED_FIELDS = {
+        "users": ["email", "role", "status", "created_at", "full_name", "updated_at"],
+        "hospitals": ["status", "created_at", "name", "updated_at"],
+        "slaughterhouses": ["status", "created_at", "name", "updated_at"],
+        "feedbacks": ["status", "created_at", "target_type", "rating", "updated_at"],
+        "activities": ["timestamp", "type", "user_id", "entity_type", "entity_id"],
+        "user_settings": [],
+        "tombstones": ["collection", "deleted_at"],
+    }
+
+    OPERATORS = {"==": "=", "!=": "!=", "<": "<", "<=": "<=", ">": ">", ">=": ">="}
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._tables = set()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for collection in COLLECTIONS:
+            self._ensure_table(collection)
+
+    @staticmethod
+    def _table(collection: str) -> str:
+        if not re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', collection):
+            raise ValueError(f"Invalid collection name: {collection}")
+        return f'"{collection}"'
+
+    @staticmethod
+    def _field(field: str) -> str:
+        if field == "id":
+            return "id"
+        if not re.match(r'^[A-Za-z_][A-Za-z0-9_.]*$', field):
+            raise ValueError(f"Invalid field name: {field}")
+        return f"json_extract(data, '$.{field}')"
+
+    @staticmethod
+    def _encode_value(value):
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if isinstance(value, bool):
+            return int(value)
+        return value
+
+    @staticmethod
+    def _json_default(value):
+        if isinstance(value, datetime):
+            return value.isoformat()
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+    def _dumps(self, data: Dict[str, Any]) -> str:
+        return json.dumps(data, default=self._json_default)
+
+    def _ensure_table(self, collection: str):
+        if collection in self._tables:
+            return
+        table = self._table(collection)
+        with self._lock:
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            for field in self.INDEXED_FIELDS.get(collection, []):
+                self._conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS "idx_{collection}_{field}" ON {table} ({self._field(field)})'
+                )
+            self._tables.add(collection)
+
+    def _load(self, doc_id: str, raw: str) -> Dict[str, Any]:
+        data = json.loads(raw)
+        data["id"] = doc_id
+        return data
+
+    def get(self, collection, doc_id):
+        self._ensure_table(collection)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT id, data FROM {self._table(collection)} WHERE id = ?", (doc_id,)
+            ).fetchone()
+        return self._load(*row) if row else None
+
+    def set(self, collection, doc_id, data, merge=False):
+        self._ensure_table(collection)
+        with self._lock:
+            if merge:
+                existing = self.get(collection, doc_id) or {}
+                data = _deep_merge(existing, data)
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self._table(collection)} (id, data) VALUES (?, ?)",
+                (doc_id, self._dumps(data))
+            )
+
+    def update(self, collection, doc_id, data):
+        self._ensure_table(collection)
+        with self._lock:
+            existing = self.get(collection, doc_id)
+            if existing is None:
+                raise KeyError(f"No document to update: {collection}/{doc_id}")
+            existing.update(data)
+            self._conn.execute(
+                f"UPDATE {self._table(collection)} SET data = ? WHERE id = ?",
+                (self._dumps(existing), doc_id)
+            )
+
+    def delete(self, collection, doc_id):
+        self._ensure_table(collection)
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self._table(collection)} WHERE id = ?", (doc_id,))
+
+    def _clauses(self, filters) -> tuple:
+        clauses = []
+        params = []
+        for field, op, value in filters or []:
+            column = self._field(field)
+            if op == "in":
+                values = list(value)
+                clauses.append(f"{column} IN ({', '.join('?' for _ in values)})")
+                params.extend(self._encode_value(v) for v in values)
+            elif op == "array_contains":
+                clauses.append(f"EXISTS (SELECT 1 FROM json_each(data, '$.{field}') WHERE value = ?)")
+                params.append(self._encode_value(value))
+            elif op == "==" and value is None:
+                clauses.append(f"{column} IS NULL")
+            elif op in self.OPERATORS:
+                clauses.append(f"{column} {self.OPERATORS[op]} ?")
+                params.append(self._encode_value(value))
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+        return clauses, params
+
+    @staticmethod
+    def _where(clauses) -> str:
+        return f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    def _select(self, collection, filters=None, order_by=None, descending=False, limit=None, start_after=None):
+        self._ensure_table(collection)
+        clauses, params = self._clauses(filters)
+        order_fields = [order_by] if isinstance(order_by, str) else list(order_by or [])
+        columns = [self._field(field) for field in order_fields]
+        # Firestore omits documents that lack an ordered field
+        clauses.extend(f"{column} IS NOT NULL" for column in columns if column != "id")
+        if start_after:
+            placeholders = ", ".join("?" for _ in start_after)
+            clauses.append(f"({', '.join(columns)}) {'<' if descending else '>'} ({placeholders})")
+            params.extend(self._encode_value(value) for value in start_after)
+        sql = f"SELECT id, data FROM {self._table(collection)}{self._where(clauses)}"
+        if columns:
+            direction = "DESC" if descending else "ASC"
+            sql += f" ORDER BY {', '.join(f'{column} {direction}' for column in columns)}"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return sql, params
+
+    def query(self, collection, filters=None, order_by=None, descending=False, limit=None, start_after=None,
+              fields=None):
+        sql, params = self._select(collection, filters, order_by, descending, limit, start_after)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        docs = [self._load(doc_id, raw) for doc_id, raw in rows]
+        return [project_fields(doc, fields) for doc in docs] if fields else docs
+
+    def stream(self, collection, filters=None, order_by=None, descending=False, fields=None,
+               batch_size: int = 500):
+        sql, params = self._select(collection, filters, order_by, descending)
+        # A separate connection reads a consistent WAL snapshot without holding
+        # the shared lock for the length of the export
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for doc_id, raw in rows:
+                    doc = self._load(doc_id, raw)
+                    yield project_fields(doc, fields) if fields else doc
+        finally:
+            conn.close()
+
+    def count(self, collection, filters=None):
+        self._ensure_table(collection)
+        clauses, params = self._clauses(filters)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT COUNT(*) FROM {self._table(collection)}{self._where(clauses)}", params
+            ).fetchone()
+        return row[0]
+
+    def _apply(self, operations):
+        for op in operations:
+            self._ensure_table(op.collection)
+            if op.kind == "set":
+                self.set(op.collection, op.doc_id, op.data, merge=op.merge)
+            elif op.kind == "update":
+                self.update(op.collection, op.doc_id, op.data)
+            elif op.kind == "delete":
+                self.delete(op.collection, op.doc_id)
+            elif op.kind == "increment":
+                existing = self.get(op.collection, op.doc_id) or {}
+                self.set(op.collection, op.doc_id, _add_counts(existing, op.data))
+            else:
+                raise ValueError(f"Unsupported write operation: {op.kind}")
+
+    def commit(self, operations):
+        self.transact([], lambda docs: operations)
+
+    def transact(self, reads, plan):
+        for collection, _ in reads:
+            self._ensure_table(collection)
+        # The lock keeps other writers of this process out between the reads
+        # and the commit; BEGIN IMMEDIATE keeps other processes out
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                docs = [self.get(collection, doc_id) for collection, doc_id in reads]
+                self._apply(plan(docs))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return docs
+
+def _deep_merge(base: Dict[str, Any], updates: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge nested dicts the way Firestore set(merge=True) does"""
+    merged = dict(base)
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _deep_merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+def project_fields(doc: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """Keep only the requested top-level fields (and the id)"""
+    if not fields:
+        return doc
+    return {key: value for key, value in doc.items() if key in fields or key == "id"}
+
+def _add_counts(base: Dict[str, Any], deltas: Dict[str, Any], sign: int = 1) -> Dict[str, Any]:
+    """Add (or with sign=-1 subtract) nested numeric counters"""
+    result = dict(base)
+    for key, value in deltas.items():
+        if isinstance(value, dict):
+            current = result.get(key)
+            result[key] = _add_counts(current if isinstance(current, dict) else {}, value, sign)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            current = result.get(key)
+            result[key] = (current if isinstance(current, (int, float)) else 0) + sign * value
+        else:
+            result[key] = value
+    return result
+
+def _prune_zero_counts(counts: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop zero counters and empty maps from a nested counter dict"""
+    pruned = {}
+    for key, value in counts.items():
+        if isinstance(value, dict):
+            value = _prune_zero_counts(value)
+            if value:
+                pruned[key] = value
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            if value:
+                pruned[key] = value
+    return pruned
+
+def create_storage_backend() -> Optional[StorageBackend]:
+    """Pick the storage engine from STORAGE_BACKEND"""
+    if STORAGE_BACKEND == "sqlite":
+        backend = SQLiteBackend(SQLITE_DB_PATH)
+        print(f"✅ SQLite storage ready at: {SQLITE_DB_PATH}")
+        return backend
+    if firebase_initialized and db:
+        return FirestoreBackend(db)
+    return None
+
+store: Optional[StorageBackend] = create_storage_backend()
+
+def storage_ready() -> bool:
+    return store is not None
+
+# Called on the event loop with the WriteOps of every successful write
+write_listeners: List[Callable[[List[WriteOp]], None]] = []
+
+def on_write(listener: Callable[[List[WriteOp]], None]):
+    """Register a listener for committed writes made through this process"""
+    write_listeners.append(listener)
+    return listener
+
+def notify_writes(operations: List[WriteOp]):
+    for listener in write_listeners:
+        try:
+            listener(operations)
+        except Exception as e:
+            print(f"❌ Write listener {listener.__name__} failed: {e}")
+
+class Repository:
+    """Async, non-blocking access to one collection of the active backend"""
+
+    def __init__(self, collection: str):
+        self.collection = collection
+
+    async def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        return await run_db(store.get, self.collection, doc_id)
+
+    async def set(self, doc_id: str, data: Dict[str, Any], merge: bool = False):
+        await run_db(store.set, self.collection, doc_id, data, merge)
+        notify_writes([WriteOp("set", self.collection, doc_id, data, merge)])
+
+    async def update(self, doc_id: str, data: Dict[str, Any]):
+        await run_db(store.update, self.collection, doc_id, data)
+        notify_writes([WriteOp("update", self.collection, doc_id, data, False)])
+
+    async def delete(self, doc_id: str):
+        await run_db(store.delete, self.collection, doc_id)
+        notify_writes([WriteOp("delete", self.collection, doc_id, None, False)])
+
+    async def query(self, filters: Optional[List[tuple]] = None, order_by: Optional[Union[str, List[str]]] = None,
+                    descending: bool = False, limit: Optional[int] = None,
+                    start_after: Optional[List[Any]] = None,
+                    fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        return await run_db(store.query, self.collection, filters, order_by, descending, limit, start_after, fields)
+
+    async def count(self, filters: Optional[List[tuple]] = None) -> int:
+        return await run_db(store.count, self.collection, filters)
+
+    async def stream_batches(self, filters: Optional[List[tuple]] = None,
+                             order_by: Optional[Union[str, List[str]]] = None, descending: bool = False,
+                             fields: Optional[List[str]] = None, batch_size: int = 500):
+        """Async iterator of document lists; each batch is pulled on the db executor"""
+        iterator = store.stream(self.collection, filters, order_by, descending, fields)
+        
+        def next_batch():
+            return list(itertools.islice(iterator, batch_size))
+        
+        try:
+            while True:
+                batch = await run_db(next_batch)
+                if not batch:
+                    break
+                yield batch
+        finally:
+            iterator.close()
+
+    async def all(self) -> List[Dict[str, Any]]:
+        return await self.query()
+
+    async def find_one(self, field: str, value: Any) -> Optional[Dict[str, Any]]:
+        results = await self.query([(field, "==", value)], limit=1)
+        return results[0] if results else None
+
+class WriteBatch:
+    """Collects writes across collections and commits them in one atomic batch"""
+
+    def __init__(self):
+        self.operations: List[WriteOp] = []
+
+    def set(self, collection: str, doc_id: str, data: Dict[str, Any], merge: bool = False):
+        self.operations.append(WriteOp("set", collection, doc_id, data, merge))
+
+    def update(self, collection: str, doc_id: str, data: Dict[str, Any]):
+        self.operations.append(WriteOp("update", collection, doc_id, data, False))
+
+    def delete(self, collection: str, doc_id: str):
+        self.operations.append(WriteOp("delete", collection, doc_id, None, False))
+
+    def increment(self, collection: str, doc_id: str, deltas: Dict[str, Any]):
+        self.operations.append(WriteOp("increment", collection, doc_id, deltas, True))
+
+    async def commit(self):
+        if self.operations:
+            await run_db(store.commit, self.operations)
+            notify_writes(self.operations)
+
+async def run_transaction(reads: List[tuple], plan) -> List[Optional[Dict[str, Any]]]:
+    """Read (collection, doc_id) documents and commit what plan(batch, *docs)
+    stages from them in one transaction, so counter deltas are always taken
+    from the state being replaced. Returns the documents as read."""
+    staged: List[WriteBatch] = []
+
+    def build(docs):
+        batch = WriteBatch()
+        plan(batch, *docs)
+        staged[:] = [batch]  # Firestore reruns plan when the transaction retries
+        return batch.operations
+
+    docs = await run_db(store.transact, reads, build)
+    notify_writes(staged[0].operations)
+    return docs
+
+users_repo = Repository("users")
+hospitals_repo = Repository("hospitals")
+slaughterhouses_repo = Repository("slaughterhouses")
+feedbacks_repo = Repository("feedbacks")
+activities_repo = Repository("activities")
+settings_repo = Repository("user_settings")
+counters_repo = Repository("counter_shards")
+tombstones_repo = Repository("tombstones")
+
+# =============================
+# SINGLE-FLIGHT READ COALESCING
+# =============================
+
+SINGLE_FLIGHT_METRIC_KEYS = 500
+
+class SingleFlight:
+    """Concurrent calls with the same key await one shared execution.
+
+    Every caller receives the same result object, so coalesced results must
+    be treated as read-only.
+    """
+
+    def __init__(self, max_metric_keys: int = SINGLE_FLIGHT_METRIC_KEYS):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.metrics: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+        self.max_metric_keys = max_metric_keys
+
+    def _record(self, key: str, coalesced: bool):
+        stats = self.metrics.pop(key, None) or {"requests": 0, "executions": 0, "coalesced": 0}
+        stats["requests"] += 1
+        stats["coalesced" if coalesced else "executions"] += 1
+        self.metrics[key] = stats
+        while len(self.metrics) > self.max_metric_keys:
+            self.metrics.popitem(last=False)
+
+    def _finished(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def do(self, key: str, func):
+        task = self._inflight.get(key)
+        self._record(key, coalesced=task is not None)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._finished, key))
+        # shield: one caller disconnecting must not cancel the query for the others
+        return await asyncio.shield(task)
+
+    def snapshot(self) -> Dict[str, Any]:
+        requests = sum(m["requests"] for m in self.metrics.values())
+        coalesced = sum(m["coalesced"] for m in self.metrics.values())
+        return {
+            "in_flight": len(self._inflight),
+            "requests": requests,
+            "coalesced": coalesced,
+            "keys": dict(self.metrics)
+        }
+
+single_flight = SingleFlight()
+
+def coalesced(redact_args: bool = False):
+    """Decorator: identical concurrent calls share one in-flight execution.
+    Use redact_args for keys that would otherwise expose personal data in metrics."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            arg_key = ", ".join([repr(a) for a in args] + [f"{k}={v!r}" for k, v in sorted(kwargs.items())])
+            if redact_args and arg_key:
+                arg_key = hashlib.sha1(arg_key.encode()).hexdigest()[:12]
+            return await single_flight.do(f"{func.__name__}({arg_key})", lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
+
+# =============================
+# COLLECTION VERSIONS & CONDITIONAL GET
+# =============================
+
+# Versions restart from zero on every boot, so the boot id keeps old ETags from matching
+BOOT_ID = uuid.uuid4().hex
+STATS_COLLECTIONS = ("users", "hospitals", "slaughterhouses", "feedbacks", "activities")
+
+# Versions live in process memory and follow this process's writes plus any
+# replica listener changes. Another worker, or a client writing to Firestore
+# directly, only shows up through a live replica, so conditional GET is limited
+# to replicated collections when WEB_CONCURRENCY > 1. CONDITIONAL_GET=on/off
+# overrides the check.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+CONDITIONAL_GET = os.getenv("CONDITIONAL_GET", "auto").lower()
+
+collection_versions: Dict[str, int] = {}
+_versions_lock = threading.Lock()
+
+def bump_collection_version(collection: str):
+    with _versions_lock:
+        collection_versions[collection] = collection_versions.get(collection, 0) + 1
+
+@on_write
+def bump_written_collections(operations: List[WriteOp]):
+    for collection in {op.collection for op in operations}:
+        bump_collection_version(collection)
+
+def version_stamp(collections) -> Dict[str, int]:
+    with _versions_lock:
+        return {collection: collection_versions.get(collection, 0) for collection in collections}
+
+def versions_trusted(collections) -> bool:
+    """Whether this process's versions see every write to the collections"""
+    if CONDITIONAL_GET in ("on", "true", "1"):
+        return True
+    if CONDITIONAL_GET in ("off", "false", "0"):
+        return False
+    return WEB_CONCURRENCY <= 1 or all(ready_replica(collection) for collection in collections)
+
+def make_etag(request: Request, stamp: Dict[str, int]) -> str:
+    """Weak ETag for this URL (path + query) at the given collection versions.
+    Weak because the same version may be sent compressed or not."""
+    versions = ",".join(f"{collection}:{version}" for collection, version in sorted(stamp.items()))
+    key = f"{BOOT_ID}|{request.url.path}|{request.url.query}|{versions}"
+    return 'W/"' + hashlib.sha256(key.encode()).hexdigest()[:32] + '"'
+
+def conditional_get(*collections: str):
+    """Route dependency: tag the response with the collections' versions and
+    answer If-None-Match with 304 before the endpoint reads anything.
+
+    The stamp is taken before the endpoint's reads, so a write racing the
+    read can only make the ETag older than the body, never newer. Responses
+    go untagged while the versions can't be trusted (see versions_trusted).
+    """
+    def check(request: Request, response: Response):
+        if not versions_trusted(collections):
+            return
+        etag = make_etag(request, version_stamp(collections))
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            # Weak comparison (RFC 9110 8.8.3.2)
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            if etag.removeprefix("W/") in tags or "*" in tags:
+                raise HTTPException(status_code=304, headers={"ETag": etag})
+    return Depends(check)
+
 # =============================
 # TEMPORARY OTP STORAGE
 # =============================
@@ -130,19 +1124,19 @@ class ConnectionManager:
     async def send_initial_data(self, websocket: WebSocket):
         """Send initial dashboard data to new connection"""
         try:
-            stats = await get_dashboard_stats()
-            recent_activities = await get_recent_activities(10)
+            # Shared snapshot: a reconnect storm costs no extra datastore reads
+            snapshot = await dashboard_snapshot.get()
             
             initial_data = {
                 "type": "initial_data",
                 "data": {
-                    "stats": stats,
-                    "recent_activities": recent_activities,
+                    "stats": snapshot["stats"],
+                    "recent_activities": snapshot["recent_activities"],
                     "timestamp": datetime.now().isoformat(),
                     "connection_id": id(websocket)
                 }
             }
-            await websocket.send_json(initial_data)
+            await websocket.send_text(encode_json(initial_data).decode())
             print(f"📊 Initial data sent to client")
         except Exception as e:
             print(f"❌ Error sending initial data: {e}")
@@ -162,7 +1156,7 @@ class ConnectionManager:
         
         for connection in self.active_connections:
             try:
-                await connection.send_json(notification_data)
+                await connection.send_text(encode_json(notification_data).decode())
                 print(f"📢 Activity broadcasted to client: {activity_data.get('type')}")
             except Exception as e:
                 print(f"❌ Error broadcasting to client: {e}")
@@ -199,8 +1193,11 @@ class ActivityType(str, Enum):
     SLAUGHTERHOUSE_UPDATED = "slaughterhouse_updated"
     SLAUGHTERHOUSE_DELETED = "slaughterhouse_deleted"
     FEEDBACK_SUBMITTED = "feedback_submitted"
+    FEEDBACK_UPDATED = "feedback_updated"
     USER_UPDATED = "user_updated"
     USER_DELETED = "user_deleted"
+    FACILITIES_IMPORTED = "facilities_imported"
+    BATCH_APPLIED = "batch_applied"
     SETTINGS_UPDATED = "settings_updated"
     TWO_FACTOR_ENABLED = "two_factor_enabled"
     TWO_FACTOR_DISABLED = "two_factor_disabled"
@@ -271,6 +1268,8 @@ class FlexibleHospitalRequest(BaseModel):
     status: Optional[str] = "Active"
     operating_hours: Optional[str] = None
     hours: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
     
     @validator('services', pre=True)
     def convert_services(cls, v):
@@ -292,6 +1291,16 @@ class FlexibleSlaughterhouseRequest(BaseModel):
     operating_hours: Optional[str] = None
     hours: Optional[str] = None
     certification: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+
+class FeedbackStatus(str, Enum):
+    NEW = "new"
+    REVIEWED = "reviewed"
+    ARCHIVED = "archived"
+
+class FeedbackStatusRequest(BaseModel):
+    status: FeedbackStatus
 
 class FeedbackRequest(BaseModel):
     user_id: str
@@ -303,104 +1312,669 @@ class FeedbackRequest(BaseModel):
     comment: str
 
 # =============================
-# HELPER FUNCTIONS
+# BATCH MUTATION MODELS
 # =============================
 
-def validate_email_format(email: str) -> bool:
-    """Validate email format"""
-    email = email.strip().lower()
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
-
-def create_access_token(data: dict):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+class BatchOpType(str, Enum):
+    CREATE = "create"
+    UPDATE = "update"
+    DELETE = "delete"
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+class BatchMode(str, Enum):
+    ATOMIC = "atomic"
+    BEST_EFFORT = "best_effort"
 
-def verify_admin(token_data: dict = Depends(verify_token)):
-    if token_data.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Admin access required")
-    return token_data
+class BatchOperation(BaseModel):
+    op: BatchOpType
+    collection: str
+    id: Optional[str] = None
+    data: Dict[str, Any] = Field(default_factory=dict)
 
-async def log_activity(activity_type: ActivityType, user_id: str, user_name: str, 
-                       details: Dict[str, Any] = None):
-    """Log activity to Firestore and broadcast via WebSocket"""
-    
-    if not firebase_initialized or not db:
-        print(f"⚠️ Activity logged (Firebase not initialized): {activity_type.value}")
-        return None
-    
-    activity_id = str(uuid.uuid4())
-    current_time = datetime.now()
-    
-    activity_data = {
-        "id": activity_id,
-        "type": activity_type.value,
-        "user_id": user_id,
-        "user_name": user_name,
-        "details": details or {},
-        "timestamp": current_time,
-        "created_at": current_time
-    }
-    
-    try:
-        # Store in Firestore
-        db.collection("activities").document(activity_id).set(activity_data)
-        print(f"✅ Activity logged: {activity_type.value} by {user_name}")
-        
-        # Format for WebSocket broadcast
-        broadcast_data = {
-            "id": activity_id,
-            "type": activity_type.value,
-            "user_id": user_id,
-            "user_name": user_name,
-            "details": details or {},
-            "timestamp": current_time.isoformat(),
-            "created_at": current_time.isoformat()
-        }
-        
-        # Broadcast to all connected clients
-        await manager.broadcast_activity(broadcast_data)
-        
-    except Exception as e:
-        print(f"❌ Error logging activity: {e}")
-    
-    return activity_data
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=500)
+    mode: BatchMode = BatchMode.ATOMIC
 
 # =============================
-# FIREBASE DATABASE FUNCTIONS
+# RESPONSE MODELS & SERIALIZATION
 # =============================
 
-async def get_user_by_email(email: str):
-    """Get user from Firestore by email"""
-    if not firebase_initialized or not db:
-        return None
-    
-    try:
-        users_ref = db.collection("users")
-        query = users_ref.where("email", "==", email.lower()).limit(1)
-        docs = query.stream()
-        
-        for doc in docs:
-            user_data = doc.to_dict()
-            user_data["id"] = doc.id
-            return user_data
-    except Exception as e:
+# List endpoints return json_response() directly, so these models document
+# the schema (OpenAPI) without a per-document validation pass.
+
+class DocumentOut(BaseModel):
+    """List item: any field may be projected away with ?fields=, unknown fields pass through"""
+    model_config = ConfigDict(extra="allow")
+    id: str
+
+class UserOut(DocumentOut):
+    email: Optional[str] = None
+    full_name: Optional[str] = None
+    phone: Optional[str] = None
+    role: Optional[str] = None
+    business_name: Optional[str] = None
+    address: Optional[str] = None
+    status: Optional[str] = None
+    created_at: Optional[datetime] = None
+    last_login: Optional[datetime] = None
+
+class HospitalOut(DocumentOut):
+    name: Optional[str] = None
+    address: Optional[str] = None
+    contact: Optional[str] = None
+    phone: Optional[str] = None
+    email: Optional[str] = None
+    services: Optional[List[str]] = None
+    doctors: Optional[int] = None
+    status: Optional[str] = None
+    operating_hours: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    created_at: Optional[datetime] = None
+
+class SlaughterhouseOut(DocumentOut):
+    name: Optional[str] = None
+    address: Optional[str] = None
+    contact: Optional[str] = None
+    phone: Optional[str] = None
+    email: Optional[str] = None
+    capacity: Optional[str] = None
+    status: Optional[str] = None
+    operating_hours: Optional[str] = None
+    certification: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    created_at: Optional[datetime] = None
+
+class FeedbackOut(DocumentOut):
+    user_id: Optional[str] = None
+    user_name: Optional[str] = None
+    target_type: Optional[str] = None
+    target_id: Optional[str] = None
+    target_name: Optional[str] = None
+    rating: Optional[int] = None
+    comment: Optional[str] = None
+    status: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+class ActivityOut(DocumentOut):
+    type: Optional[str] = None
+    user_id: Optional[str] = None
+    user_name: Optional[str] = None
+    details: Optional[Dict[str, Any]] = None
+    timestamp: Optional[datetime] = None
+
+class PageOut(BaseModel):
+    total: int  # matching documents in the collection, not just this page
+    count: int  # documents in this page
+    next_cursor: Optional[str] = None
+    success: bool = True
+
+class UserPage(PageOut):
+    users: List[UserOut]
+
+class HospitalPage(PageOut):
+    hospitals: List[HospitalOut]
+
+class SlaughterhousePage(PageOut):
+    slaughterhouses: List[SlaughterhouseOut]
+
+class FeedbackPage(PageOut):
+    feedbacks: List[FeedbackOut]
+
+class ActivityPage(PageOut):
+    activities: List[ActivityOut]
+
+# =============================
+# WRITE-BEHIND ACTIVITY QUEUE
+# =============================
+
+ACTIVITY_FLUSH_SIZE = int(os.getenv("ACTIVITY_FLUSH_SIZE", "200"))          # per WriteBatch, at most 500
+ACTIVITY_FLUSH_INTERVAL = float(os.getenv("ACTIVITY_FLUSH_INTERVAL", "0.5"))  # seconds
+ACTIVITY_QUEUE_HIGH_WATER = int(os.getenv("ACTIVITY_QUEUE_HIGH_WATER", "5000"))
+ACTIVITY_FLUSH_ATTEMPTS = 3
+
+def activity_partition(timestamp) -> str:
+    """Month partition (YYYY-MM) an activity is archived under"""
+    timestamp = parse_timestamp(timestamp) or datetime.now()
+    return timestamp.strftime("%Y-%m")
+
+def _parse_rollup_windows(spec: str) -> Dict[str, float]:
+    """'user_login=60,settings_updated=300' -> {activity type: window seconds}"""
+    windows = {}
+    for item in spec.split(","):
+        activity_type, _, seconds = item.partition("=")
+        if activity_type.strip() and seconds.strip():
+            windows[activity_type.strip()] = float(seconds)
+    return windows
+
+# High-frequency activity types are stored as one aggregated activity per
+# window; every other type (deletes, updates, ...) is kept verbatim
+ACTIVITY_ROLLUP_WINDOWS = _parse_rollup_windows(
+    os.getenv("ACTIVITY_ROLLUP_WINDOWS", "user_login=60,settings_updated=60")
+)
+ACTIVITY_ROLLUP_SAMPLE = 5  # actors named in an aggregated activity
+
+class ActivityRollup:
+    """Per-type aggregation windows for high-frequency activities.
+
+    The first activity of a type is stored and broadcast straight away and
+    opens a window; everything of that type after it until the window closes
+    is folded in. A closed window with nothing folded emits nothing, with a
+    single activity emits it verbatim, otherwise one activity carrying the
+    count, the distinct actor count and a sample of actors. Every actor id
+    goes into user_ids, so the summary still shows up in each actor's history.
+    """
+
+    def __init__(self, windows: Dict[str, float], sample_size: int):
+        self.windows = windows
+        self.sample_size = sample_size
+        self.open: Dict[str, Dict[str, Any]] = {}
+        self.folded = 0
+
+    def add(self, activity: Dict[str, Any]) -> bool:
+        """Fold an activity into its type's open window; False if it should be
+        written now (its type is not rolled up, or it opens the window)"""
+        window = self.windows.get(activity["type"])
+        if not window:
+            return False
+        bucket = self.open.get(activity["type"])
+        if bucket is None:
+            self.open[activity["type"]] = {
+                "closes_at": time.monotonic() + window, "window": window,
+                "first": None, "last_at": None, "count": 0, "actors": {}, "entities": set()
+            }
+            return False
+        if bucket["first"] is None:
+            bucket["first"] = activity
+        bucket["count"] += 1
+        bucket["last_at"] = activity["timestamp"]
+        if activity["user_id"] not in bucket["actors"]:
+            bucket["actors"][activity["user_id"]] = activity["user_name"]
+        bucket["entities"].add((activity.get("entity_type"), activity.get("entity_id")))
+        self.folded += 1
+        return True
+
+    def collect(self, force: bool = False) -> List[Dict[str, Any]]:
+        """Activities for every window that has closed (all of them with force)"""
+        now = time.monotonic()
+        closed = [activity_type for activity_type, bucket in self.open.items()
+                  if force or bucket["closes_at"] <= now]
+        buckets = [(activity_type, self.open.pop(activity_type)) for activity_type in closed]
+        return [self._emit(activity_type, bucket) for activity_type, bucket in buckets if bucket["count"]]
+
+    def _emit(self, activity_type: str, bucket: Dict[str, Any]) -> Dict[str, Any]:
+        if bucket["count"] == 1:
+            return bucket["first"]
+        first_at = bucket["first"]["timestamp"]
+        sample = list(bucket["actors"].items())[:self.sample_size]
+        # A window about a single subject keeps it for the entity history
+        entity_type, entity_id = next(iter(bucket["entities"])) if len(bucket["entities"]) == 1 else (None, None)
+        return {
+            "id": str(uuid.uuid4()),
+            "type": activity_type,
+            "user_id": "system",
+            "user_name": "system",
+            "user_ids": list(bucket["actors"]),
+            "details": {
+                "rollup": True,
+                "count": bucket["count"],
+                "unique_actors": len(bucket["actors"]),
+                "sample_actors": [{"user_id": user_id, "user_name": user_name} for user_id, user_name in sample],
+                "window_seconds": bucket["window"],
+                "first_at": first_at.isoformat(),
+                "last_at": bucket["last_at"].isoformat()
+            },
+            "timestamp": bucket["last_at"],
+            "created_at": bucket["last_at"],
+            "partition": activity_partition(bucket["last_at"]),
+            "entity_type": entity_type,
+            "entity_id": entity_id
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "windows": self.windows,
+            "folded": self.folded,
+            "open": {activity_type: bucket["count"] for activity_type, bucket in self.open.items()}
+        }
+
+def _window_text(details: Dict[str, Any]) -> str:
+    """'minute', '5 minutes' or '30 seconds' for an aggregated activity's window"""
+    seconds = float(details.get("window_seconds", 60))
+    for unit, size in (("hour", 3600), ("minute", 60)):
+        if seconds >= size and seconds % size == 0:
+            return unit if seconds == size else f"{int(seconds // size)} {unit}s"
+    return f"{seconds:g} seconds"
+
+class ActivityQueue:
+    """Write-behind buffer between log_activity and the activities collection.
+
+    log_activity only enqueues; rolled-up types after the first of their
+    window go to the ActivityRollup and enter the queue when it closes. One flusher task writes pending
+    activities in WriteBatches once flush_size are waiting or every interval,
+    then broadcasts them in the background. At the high-water mark writers wait
+    for the flusher, so a slow datastore slows them down instead of growing
+    the queue without bound. Shutdown drains whatever is still pending.
+    """
+
+    def __init__(self, flush_size: int, interval: float, high_water: int, rollup: ActivityRollup):
+        self.flush_size = max(1, min(flush_size, 500))
+        self.rollup = rollup
+        self.interval = interval
+        self.high_water = max(high_water, self.flush_size)
+        self.pending: List[tuple] = []  # (activity, failed attempts)
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._flushed: Optional[asyncio.Event] = None
+        self._closing = False
+        self._broadcasts = set()
+        self.stats = {"enqueued": 0, "written": 0, "flushes": 0, "failed_flushes": 0, "dropped": 0,
+                      "backpressure_waits": 0}
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            # Events belong to the running loop, so they are created with the task
+            self._wake = asyncio.Event()
+            self._flushed = asyncio.Event()
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def put(self, activity: Dict[str, Any]):
+        self._ensure_started()
+        if self.rollup.add(activity):
+            return
+        if len(self.pending) >= self.high_water:
+            self.stats["backpressure_waits"] += 1
+            while len(self.pending) >= self.high_water:
+                self._flushed.clear()
+                self._wake.set()
+                await self._flushed.wait()
+        self._enqueue(activity)
+        if len(self.pending) >= self.flush_size:
+            self._wake.set()
+
+    def _enqueue(self, activity: Dict[str, Any]):
+        self.pending.append((activity, 0))
+        self.stats["enqueued"] += 1
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            for activity in self.rollup.collect():
+                self._enqueue(activity)
+            while self.pending and await self._flush_once():
+                pass
+            if self._closing:
+                return
+
+    async def _flush_once(self) -> bool:
+        entries = self.pending[:self.flush_size]
+        del self.pending[:len(entries)]
+        batch = WriteBatch()
+        for activity, _ in entries:
+            batch.set(activities_repo.collection, activity["id"], activity)
+        try:
+            await batch.commit()
+        except Exception as e:
+            retry = [(activity, attempts + 1) for activity, attempts in entries
+                     if attempts + 1 < ACTIVITY_FLUSH_ATTEMPTS]
+            self.pending[:0] = retry
+            self.stats["failed_flushes"] += 1
+            self.stats["dropped"] += len(entries) - len(retry)
+            print(f"❌ Error flushing {len(entries)} activities ({len(entries) - len(retry)} dropped): {e}")
+            return False
+        finally:
+            self._flushed.set()
+        
+        self.stats["written"] += len(entries)
+        self.stats["flushes"] += 1
+        print(f"✅ Activities flushed: {len(entries)}")
+        
+        if not self._closing:
+            # Every logged write changes what the dashboard shows
+            dashboard_snapshot.invalidate()
+        
+        task = asyncio.create_task(self._broadcast([activity for activity, _ in entries]))
+        self._broadcasts.add(task)
+        task.add_done_callback(self._broadcasts.discard)
+        return True
+
+    async def _broadcast(self, activities: List[Dict[str, Any]]):
+        for activity in activities:
+            await manager.broadcast_activity({
+                **activity,
+                "timestamp": activity["timestamp"].isoformat(),
+                "created_at": activity["created_at"].isoformat()
+            })
+
+    async def drain(self):
+        """Flush everything still queued and wait for the broadcasts"""
+        self._closing = True
+        if self._task is not None and not self._task.done():
+            self._wake.set()
+            await self._task
+        for activity in self.rollup.collect(force=True):
+            self._enqueue(activity)
+        while self.pending and await self._flush_once():
+            pass
+        if self.pending:
+            print(f"❌ {len(self.pending)} activities could not be written on shutdown")
+        await asyncio.gather(*list(self._broadcasts), return_exceptions=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "pending": len(self.pending), "high_water": self.high_water,
+                "rollup": self.rollup.snapshot()}
+
+activity_queue = ActivityQueue(ACTIVITY_FLUSH_SIZE, ACTIVITY_FLUSH_INTERVAL, ACTIVITY_QUEUE_HIGH_WATER,
+                               ActivityRollup(ACTIVITY_ROLLUP_WINDOWS, ACTIVITY_ROLLUP_SAMPLE))
+
+# =============================
+# RECENT ACTIVITY BUFFER
+# =============================
+
+# Recent-activity reads are answered from memory. Activities logged by other
+# processes only show up after a restart, so multi-instance deployments that
+# need them live set ACTIVITY_BUFFER_SIZE=0 to read the datastore instead.
+ACTIVITY_BUFFER_SIZE = int(os.getenv("ACTIVITY_BUFFER_SIZE", "5000"))
+
+class ActivityBuffer:
+    """Bounded, timestamp-ordered ring of the newest activities.
+
+    Seeded with the newest `capacity` activities at startup, then fed by
+    committed writes, so queued activities appear once their flush lands
+    and a dropped batch never shows up. While
+    it still holds every stored activity (complete) it answers any page;
+    after the first eviction, pages that run past its oldest entry fall back
+    to the datastore.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.entries: deque = deque()  # (sort key, activity), oldest first
+        self.ids = set()
+        self.ready = False
+        self.complete = False
+        self.served = 0
+        self.fallbacks = 0
+
+    @staticmethod
+    def _key(activity: Dict[str, Any]) -> tuple:
+        return (_sync_time(activity.get("timestamp"), stored=True) or datetime.min, activity["id"])
+
+    def add(self, activity: Dict[str, Any]):
+        if self.capacity <= 0 or activity["id"] in self.ids:
+            return
+        entry = (self._key(activity), activity)
+        if len(self.entries) >= self.capacity:
+            _, evicted = self.entries.popleft()
+            self.ids.discard(evicted["id"])
+            self.complete = False
+        # Activities arrive almost in order; rollups land a little behind the newest
+        position = len(self.entries)
+        while position and self.entries[position - 1][0] > entry[0]:
+            position -= 1
+        self.entries.insert(position, entry)
+        self.ids.add(activity["id"])
+
+    def discard(self, activity_ids: set):
+        if self.ids & activity_ids:
+            self.entries = deque(entry for entry in self.entries if entry[1]["id"] not in activity_ids)
+            self.ids -= activity_ids
+
+    async def seed(self):
+        if self.capacity <= 0:
+            return
+        try:
+            docs = await activities_repo.query(order_by="timestamp", descending=True, limit=self.capacity)
+        except Exception as e:
+            print(f"❌ Activity buffer seed failed: {e}")
+            return
+        # Activities logged while the seed query ran are already in the buffer
+        for doc in reversed(docs):
+            self.add(doc)
+        self.complete = len(docs) < self.capacity
+        self.ready = True
+        print(f"✅ Activity buffer seeded: {len(self.entries)} activities")
+
+    def page(self, limit: int, before: Optional[tuple] = None,
+             activity_type: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """Up to limit + 1 activities, newest first, strictly older than before;
+        None when the buffer cannot answer and the datastore has to"""
+        if not self.ready:
+            return None
+        matches = []
+        for key, activity in reversed(self.entries):
+            if before is not None and key >= before:
+                continue
+            if activity_type and activity.get("type") != activity_type:
+                continue
+            matches.append(activity)
+            if len(matches) > limit:
+                break
+        if len(matches) <= limit and not self.complete:
+            self.fallbacks += 1
+            return None
+        self.served += 1
+        return matches
+
+    def count(self, activity_type: Optional[str] = None) -> Optional[int]:
+        """Stored activities (of one type); None unless the buffer holds them all"""
+        if not (self.ready and self.complete):
+            return None
+        return sum(1 for _, activity in self.entries if not activity_type or activity.get("type") == activity_type)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "complete": self.complete, "size": len(self.entries),
+                "capacity": self.capacity, "served": self.served, "fallbacks": self.fallbacks}
+
+recent_activities = ActivityBuffer(ACTIVITY_BUFFER_SIZE)
+
+@on_write
+def update_activity_buffer(operations: List[WriteOp]):
+    deleted = set()
+    for op in operations:
+        if op.collection != activities_repo.collection:
+            continue
+        if op.kind == "delete":
+            deleted.add(op.doc_id)
+        elif op.kind == "set" and not op.merge:
+            recent_activities.add({**op.data, "id": op.doc_id})
+    recent_activities.discard(deleted)
+
+@app.on_event("startup")
+async def seed_activity_buffer():
+    if storage_ready():
+        await recent_activities.seed()
+
+# =============================
+# HELPER FUNCTIONS
+# =============================
+
+def validate_email_format(email: str) -> bool:
+    """Validate email format"""
+    email = email.strip().lower()
+    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+    return re.match(pattern, email) is not None
+
+def create_access_token(data: dict):
+    to_encode = data.copy()
+    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode.update({"exp": expire})
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    try:
+        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        return payload
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+
+def verify_admin(token_data: dict = Depends(verify_token)):
+    if token_data.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return token_data
+
+def build_hospital_document(hospital_id: str, hospital: "FlexibleHospitalRequest") -> Dict[str, Any]:
+    """Stored form of a new hospital (shared by the single and bulk endpoints)"""
+    # Get phone from either contact or phone field
+    phone = hospital.phone or hospital.contact or ""
+    
+    # Convert services if needed
+    services = []
+    if hospital.services:
+        if isinstance(hospital.services, str):
+            services = [s.strip() for s in hospital.services.split(',') if s.strip()]
+        elif isinstance(hospital.services, list):
+            services = hospital.services
+    
+    now = datetime.now()
+    hospital_data = {
+        "id": hospital_id,
+        "name": hospital.name,
+        "address": hospital.address or "",
+        "contact": phone,
+        "phone": phone,
+        "email": hospital.email or "",
+        "services": services,
+        "doctors": hospital.doctors or 0,
+        "status": hospital.status or "Active",
+        "operating_hours": hospital.operating_hours or hospital.hours or "",
+        **coordinates(hospital.latitude, hospital.longitude),
+        "created_at": now,
+        "updated_at": now,
+        "created_by": "system"
+    }
+    # Clean up None values
+    return {k: v for k, v in hospital_data.items() if v is not None}
+
+def build_slaughterhouse_document(slaughterhouse_id: str,
+                                  slaughterhouse: "FlexibleSlaughterhouseRequest") -> Dict[str, Any]:
+    """Stored form of a new slaughterhouse (shared by the single and bulk endpoints)"""
+    # Get phone from either contact or phone field
+    phone = slaughterhouse.phone or slaughterhouse.contact or ""
+    now = datetime.now()
+    
+    slaughterhouse_data = {
+        "id": slaughterhouse_id,
+        "name": slaughterhouse.name,
+        "address": slaughterhouse.address or "",
+        "contact": phone,
+        "phone": phone,
+        "email": slaughterhouse.email or "",
+        "capacity": slaughterhouse.capacity or "",
+        "status": slaughterhouse.status or "Active",
+        "operating_hours": slaughterhouse.operating_hours or slaughterhouse.hours or "",
+        "certification": slaughterhouse.certification or "",
+        **coordinates(slaughterhouse.latitude, slaughterhouse.longitude),
+        "created_at": now,
+        "updated_at": now,
+        "created_by": "system"
+    }
+    # Clean up None values
+    return {k: v for k, v in slaughterhouse_data.items() if v is not None}
+
+def prepare_facility_update(update: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalize a hospital/slaughterhouse update body the way stored documents expect"""
+    # Handle services field conversion if it's a string
+    if 'services' in update and isinstance(update['services'], str):
+        update['services'] = [s.strip() for s in update['services'].split(',') if s.strip()]
+    
+    # Handle contact/phone fields
+    if 'phone' in update and 'contact' not in update:
+        update['contact'] = update['phone']
+    elif 'contact' in update and 'phone' not in update:
+        update['phone'] = update['contact']
+    
+    if "latitude" in update or "longitude" in update:
+        update.update(coordinates(update.get("latitude"), update.get("longitude")))
+    
+    # Add update metadata
+    update["updated_at"] = datetime.now()
+    update["updated_by"] = "system"
+    return update
+
+# details keys naming the document an activity is about, most specific first
+ACTIVITY_ENTITY_KEYS = (
+    ("hospital_id", "hospital"),
+    ("slaughterhouse_id", "slaughterhouse"),
+    ("feedback_id", "feedback"),
+    ("deleted_user_id", "user"),
+    ("user_id", "user"),
+)
+ENTITY_TYPES = ("user", "hospital", "slaughterhouse", "feedback")
+
+def activity_entity(user_id: str, details: Optional[Dict[str, Any]]) -> tuple:
+    """(entity_type, entity_id) an activity is about; a user acting on their
+    own account (login, settings, 2FA) is the entity when details name none"""
+    for key, entity_type in ACTIVITY_ENTITY_KEYS:
+        if (details or {}).get(key):
+            return entity_type, str(details[key])
+    if user_id and user_id != "system":
+        return "user", user_id
+    return None, None
+
+async def log_activity(activity_type: ActivityType, user_id: str, user_name: str, 
+                       details: Dict[str, Any] = None):
+    """Queue an activity for the write-behind flusher, which stores and broadcasts it"""
+    
+    if not storage_ready():
+        print(f"⚠️ Activity logged (Firebase not initialized): {activity_type.value}")
+        return None
+    
+    activity_id = str(uuid.uuid4())
+    current_time = datetime.now()
+    entity_type, entity_id = activity_entity(user_id, details)
+    
+    activity_data = {
+        "id": activity_id,
+        "type": activity_type.value,
+        "user_id": user_id,
+        "user_name": user_name,
+        # Everyone the activity is by; rollups list all their actors here
+        "user_ids": [user_id],
+        "details": details or {},
+        "timestamp": current_time,
+        "created_at": current_time,
+        "partition": activity_partition(current_time),
+        # Top-level copies of the subject so history queries hit an index
+        "entity_type": entity_type,
+        "entity_id": entity_id
+    }
+    
+    # Waits only when the queue is at its high-water mark
+    await activity_queue.put(activity_data)
+    print(f"✅ Activity logged: {activity_type.value} by {user_name}")
+    
+    return activity_data
+
+# =============================
+# FIREBASE DATABASE FUNCTIONS
+# =============================
+
+@coalesced(redact_args=True)
+async def get_user_by_email(email: str):
+    """Get user from Firestore by email"""
+    if not storage_ready():
+        return None
+    
+    replica = ready_replica("users")
+    if replica:
+        return replica.find_one("email", email.lower())
+    
+    try:
+        return await users_repo.find_one("email", email.lower())
+    except Exception as e:
         print(f"❌ Error fetching user: {e}")
     
     return None
 
 async def create_user_in_firestore(user_data: dict):
     """Create user in Firestore"""
-    if not firebase_initialized or not db:
+    if not storage_ready():
         raise HTTPException(status_code=503, detail="Firebase not initialized. Please configure Firebase.")
     
     try:
@@ -409,6 +1983,7 @@ async def create_user_in_firestore(user_data: dict):
         
         # Create user document
         user_id = str(uuid.uuid4())
+        now = datetime.now()
         
         # Prepare user document
         user_doc = {
@@ -420,13 +1995,17 @@ async def create_user_in_firestore(user_data: dict):
             "role": user_data.get("role", "farmer"),
             "business_name": user_data.get("business_name"),
             "address": user_data.get("address"),
-            "created_at": datetime.now(),
+            "created_at": now,
+            "updated_at": now,
             "last_login": None,
             "status": "active"
         }
         
-        # Save to Firestore
-        db.collection("users").document(user_id).set(user_doc)
+        # Save to Firestore together with the dashboard counters
+        batch = WriteBatch()
+        batch.set("users", user_id, user_doc)
+        stage_counter_updates(batch, "users", None, user_doc)
+        await batch.commit()
         
         print(f"✅ User created in Firestore: {user_data['email']}")
         return user_doc
@@ -435,173 +2014,1131 @@ async def create_user_in_firestore(user_data: dict):
         print(f"❌ Error creating user: {e}")
         raise HTTPException(status_code=500, detail=f"Error creating user: {str(e)}")
 
-async def get_all_users():
-    """Get all users from Firestore"""
-    if not firebase_initialized or not db:
+async def count_documents(repo: Repository, filters: Optional[List[tuple]] = None) -> int:
+    """Count documents with a server-side aggregation query"""
+    if not storage_ready():
+        return 0
+    
+    replica = ready_replica(repo.collection)
+    if replica:
+        return replica.count(filters)
+    
+    try:
+        return await repo.count(filters)
+    except Exception as e:
+        print(f"❌ Error counting {repo.collection}: {e}")
+        return 0
+
+# Dashboard counter holding each listed collection's size
+COLLECTION_TOTAL_COUNTERS = {
+    "users": "total_users",
+    "hospitals": "total_hospitals",
+    "slaughterhouses": "total_slaughterhouse_facilities",
+    "feedbacks": "total_feedbacks",
+}
+
+async def collection_total(repo: Repository, filters: Optional[List[tuple]] = None) -> int:
+    """Matching documents for a list response's total.
+
+    Unfiltered lists and single facet filters (status, role) read the sharded
+    counters; any other filter falls back to an aggregation count.
+    """
+    collection = repo.collection
+    try:
+        if not filters:
+            total = (await dashboard_counters.read()).get(COLLECTION_TOTAL_COUNTERS[collection])
+            if total is not None:
+                return int(total)
+        elif len(filters) == 1 and filters[0][1] == "==" and filters[0][0] in FACET_FIELDS.get(collection, []):
+            field, _, value = filters[0]
+            buckets = (await facet_counters.read()).get(collection, {}).get(field)
+            if buckets is not None:
+                return int(buckets.get(str(getattr(value, "value", value)), 0))
+    except Exception as e:
+        print(f"❌ Error reading counters for {collection}: {e}")
+    return await count_documents(repo, filters)
+
+async def activity_total(filters: Optional[List[tuple]] = None) -> int:
+    """Activities matching the filters, counted in the buffer when it holds them all"""
+    if not filters or (len(filters) == 1 and filters[0][:2] == ("type", "==")):
+        total = recent_activities.count(filters[0][2] if filters else None)
+        if total is not None:
+            return total
+    return await count_documents(activities_repo, filters)
+
+@coalesced()
+async def get_recent_activities(limit: int = 20, activity_type: Optional[str] = None):
+    """Get recent activities from the in-memory buffer, or Firestore when it cannot answer"""
+    if not storage_ready():
         return []
     
+    buffered = recent_activities.page(limit, activity_type=activity_type)
+    if buffered is not None:
+        return buffered[:limit]
     try:
-        users_ref = db.collection("users")
-        docs = users_ref.stream()
-        
-        users = []
-        for doc in docs:
-            user_data = doc.to_dict()
-            user_data["id"] = doc.id
-            # Convert datetime to string
-            if "created_at" in user_data and user_data["created_at"]:
-                if isinstance(user_data["created_at"], datetime):
-                    user_data["created_at"] = user_data["created_at"].isoformat()
-            if "last_login" in user_data and user_data["last_login"]:
-                if isinstance(user_data["last_login"], datetime):
-                    user_data["last_login"] = user_data["last_login"].isoformat()
-            users.append(user_data)
-        
-        return users
+        # Datetimes are left as-is; the response encoder serializes them
+        filters = [("type", "==", activity_type)] if activity_type else None
+        return await activities_repo.query(filters, order_by="timestamp", descending=True, limit=limit)
     except Exception as e:
-        print(f"❌ Error fetching users: {e}")
+        print(f"❌ Error fetching activities: {e}")
         return []
 
-async def get_all_hospitals():
-    """Get all hospitals from Firestore"""
-    if not firebase_initialized or not db:
-        return []
+# =============================
+# USER SETTINGS FUNCTIONS
+# =============================
+
+async def get_user_settings(user_id: str):
+    """Get user settings from Firestore"""
+    if not storage_ready():
+        return None
     
     try:
-        hospitals_ref = db.collection("hospitals")
-        docs = hospitals_ref.stream()
+        settings_data = await settings_repo.get(user_id)
         
-        hospitals = []
-        for doc in docs:
-            hospital_data = doc.to_dict()
-            hospital_data["id"] = doc.id
-            if "created_at" in hospital_data and hospital_data["created_at"]:
-                if isinstance(hospital_data["created_at"], datetime):
-                    hospital_data["created_at"] = hospital_data["created_at"].isoformat()
-            hospitals.append(hospital_data)
-        
-        return hospitals
+        if settings_data:
+            return settings_data
+        else:
+            # Return default settings if not found
+            default_settings = {
+                "theme": "light",
+                "language": "english",
+                "notifications": True,
+                "sounds": True,
+                "auto_save": True,
+                "two_factor_auth": False,
+                "created_at": datetime.now(),
+                "updated_at": datetime.now(),
+                "user_id": user_id
+            }
+            # Save default settings
+            await settings_repo.set(user_id, default_settings)
+            return default_settings
     except Exception as e:
-        print(f"❌ Error fetching hospitals: {e}")
-        return []
+        print(f"❌ Error fetching user settings: {e}")
+        return None
+
+async def update_user_settings(user_id: str, settings_data: dict):
+    """Update user settings in Firestore"""
+    if not storage_ready():
+        raise HTTPException(status_code=503, detail="Firebase not initialized")
+    
+    try:
+        # Add metadata
+        settings_data["updated_at"] = datetime.now()
+        settings_data["user_id"] = user_id
+        
+        # Update or create settings
+        await settings_repo.set(user_id, settings_data, merge=True)
+        print(f"✅ Settings updated for user: {user_id}")
+        
+        return settings_data
+    except Exception as e:
+        print(f"❌ Error updating user settings: {e}")
+        raise HTTPException(status_code=500, detail=f"Error updating settings: {str(e)}")
+
+# =============================
+# MATERIALIZED DASHBOARD COUNTERS
+# =============================
+
+COUNTER_SHARDS = int(os.getenv("COUNTER_SHARDS", "8"))
+SIGNUP_WINDOW_DAYS = 30
+
+def parse_timestamp(value) -> Optional[datetime]:
+    """Parse a stored datetime or ISO string into a timezone-aware datetime"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+class ShardedCounter:
+    """Nested counters spread over several shard documents.
+
+    Writers increment one random shard inside their own WriteBatch, so a
+    counter update always lands atomically with the document change that
+    caused it. Readers sum all shards with a single query.
+    """
+
+    def __init__(self, name: str, shards: int = COUNTER_SHARDS):
+        self.name = name
+        self.shards = shards
+
+    def stage(self, batch: WriteBatch, deltas: Dict[str, Any]):
+        deltas = _prune_zero_counts(deltas)
+        if deltas:
+            shard_id = f"{self.name}_{random.randrange(self.shards)}"
+            batch.increment(counters_repo.collection, shard_id, {"counter": self.name, **deltas})
+
+    async def read(self) -> Dict[str, Any]:
+        totals: Dict[str, Any] = {}
+        for shard in await counters_repo.query([("counter", "==", self.name)]):
+            shard.pop("counter", None)
+            shard.pop("id", None)
+            totals = _add_counts(totals, shard)
+        return _prune_zero_counts(totals)
+
+    async def exists(self) -> bool:
+        return bool(await counters_repo.query([("counter", "==", self.name)], limit=1))
+
+    async def reset(self, values: Dict[str, Any]):
+        batch = WriteBatch()
+        batch.set(counters_repo.collection, f"{self.name}_0", {"counter": self.name, **values})
+        for shard in range(1, self.shards):
+            batch.delete(counters_repo.collection, f"{self.name}_{shard}")
+        await batch.commit()
+
+dashboard_counters = ShardedCounter("dashboard")
+
+def stats_contribution(collection: str, doc: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """What a single document adds to the dashboard counters"""
+    if not doc:
+        return {}
+    if collection == "users":
+        contribution = {"total_users": 1, "users_by_role": {doc.get("role") or "unknown": 1}}
+        # Day buckets follow the server-local clock the write paths stamp with
+        created_at = _sync_time(doc.get("created_at"), stored=True)
+        if created_at:
+            contribution["signups_by_day"] = {created_at.strftime("%Y%m%d"): 1}
+        return contribution
+    if collection == "hospitals":
+        return {"total_hospitals": 1}
+    if collection == "slaughterhouses":
+        return {"total_slaughterhouse_facilities": 1}
+    if collection == "feedbacks":
+        return {"total_feedbacks": 1, "feedbacks_by_status": {doc.get("status") or "unknown": 1}}
+    return {}
+
+facet_counters = ShardedCounter("facets")
+
+FACET_FIELDS = {
+    "hospitals": ["status", "services"],
+    "slaughterhouses": ["status"],
+    "users": ["role", "status"],
+}
+
+def _facet_values(value) -> List[str]:
+    """Facet buckets for one field value; list fields count once per entry"""
+    if isinstance(value, str) and "," in value:
+        value = value.split(",")
+    values = value if isinstance(value, list) else [value]
+    buckets = {str(item).strip() for item in values if item is not None and str(item).strip()}
+    return sorted(buckets) or ["unknown"]
+
+def facet_contribution(collection: str, doc: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """What a single document adds to the facet counters"""
+    if not doc or collection not in FACET_FIELDS:
+        return {}
+    return {collection: {
+        field: {bucket: 1 for bucket in _facet_values(doc.get(field))}
+        for field in FACET_FIELDS[collection]
+    }}
+
+def stage_counter_updates(batch: WriteBatch, collection: str,
+                          before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]):
+    """Stage the counter deltas for a document going from before to after"""
+    deltas = _add_counts(stats_contribution(collection, after), stats_contribution(collection, before), sign=-1)
+    dashboard_counters.stage(batch, deltas)
+    facets = _add_counts(facet_contribution(collection, after), facet_contribution(collection, before), sign=-1)
+    facet_counters.stage(batch, facets)
+
+def stage_delete(batch: WriteBatch, collection: str, doc_id: str, existing: Optional[Dict[str, Any]]):
+    """Delete a document and leave a tombstone so delta sync clients drop it too.
+    existing is the document as read in the same transaction; when it is
+    already gone there is nothing to delete and no tombstone to leave."""
+    if not existing:
+        return
+    batch.delete(collection, doc_id)
+    if collection in SYNC_COLLECTIONS:
+        batch.set(tombstones_repo.collection, f"{collection}:{doc_id}", {
+            "collection": collection,
+            "doc_id": doc_id,
+            "deleted_at": datetime.now()
+        })
+
+def stage_bulk_counter_updates(batch: WriteBatch, changes: List[tuple]):
+    """One increment per counter for many (collection, before, after) changes,
+    keeping bulk batches under the write limit"""
+    stats: Dict[str, Any] = {}
+    facets: Dict[str, Any] = {}
+    for collection, before, after in changes:
+        stats = _add_counts(stats, stats_contribution(collection, after))
+        stats = _add_counts(stats, stats_contribution(collection, before), sign=-1)
+        facets = _add_counts(facets, facet_contribution(collection, after))
+        facets = _add_counts(facets, facet_contribution(collection, before), sign=-1)
+    dashboard_counters.stage(batch, stats)
+    facet_counters.stage(batch, facets)
+
+def _recent_signup_buckets(counts: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep only the signup day buckets inside the last-month window"""
+    cutoff = (datetime.now() - timedelta(days=SIGNUP_WINDOW_DAYS)).strftime("%Y%m%d")
+    counts = dict(counts)
+    counts["signups_by_day"] = {
+        day: count for day, count in counts.get("signups_by_day", {}).items() if day >= cutoff
+    }
+    return _prune_zero_counts(counts)
+
+async def compute_dashboard_counters() -> Dict[str, Any]:
+    """Recompute the dashboard counters from the source collections.
+
+    Facility and feedback totals use aggregation counts; users are still
+    scanned because the signup day buckets need every created_at.
+    """
+    statuses = [status.value for status in FeedbackStatus]
+    users, total_hospitals, total_facilities, total_feedbacks, *status_counts = await asyncio.gather(
+        users_repo.all(),
+        hospitals_repo.count(),
+        slaughterhouses_repo.count(),
+        feedbacks_repo.count(),
+        *(feedbacks_repo.count([("status", "==", status)]) for status in statuses)
+    )
+    
+    totals: Dict[str, Any] = {
+        "total_hospitals": total_hospitals,
+        "total_slaughterhouse_facilities": total_facilities,
+        "total_feedbacks": total_feedbacks,
+        "feedbacks_by_status": dict(zip(statuses, status_counts)),
+    }
+    for user in users:
+        totals = _add_counts(totals, stats_contribution("users", user))
+    return _recent_signup_buckets(totals)
+
+async def rebuild_dashboard_counters() -> Dict[str, Any]:
+    """Replace the materialized counters with freshly computed values"""
+    values = await compute_dashboard_counters()
+    await dashboard_counters.reset(values)
+    print(f"✅ Dashboard counters rebuilt: {values.get('total_users', 0)} users")
+    return values
+
+async def verify_dashboard_counters() -> Dict[str, Any]:
+    """Compare the materialized counters against a full recount"""
+    expected, actual = await asyncio.gather(compute_dashboard_counters(), dashboard_counters.read())
+    actual = _recent_signup_buckets(actual)
+    drift = _prune_zero_counts(_add_counts(actual, expected, sign=-1))
+    return {"consistent": not drift, "expected": expected, "actual": actual, "drift": drift}
+
+async def compute_facet_counts() -> Dict[str, Any]:
+    """Recompute the facet counters by scanning the faceted collections"""
+    collections = list(FACET_FIELDS)
+    scans = await asyncio.gather(*(
+        Repository(collection).query(fields=FACET_FIELDS[collection]) for collection in collections
+    ))
+    totals: Dict[str, Any] = {}
+    for collection, docs in zip(collections, scans):
+        for doc in docs:
+            totals = _add_counts(totals, facet_contribution(collection, doc))
+    return _prune_zero_counts(totals)
+
+async def rebuild_facet_counts() -> Dict[str, Any]:
+    """Replace the materialized facet counters with freshly computed values"""
+    values = await compute_facet_counts()
+    await facet_counters.reset(values)
+    print(f"✅ Facet counters rebuilt for {', '.join(values) or 'no collections'}")
+    return values
+
+async def verify_facet_counts() -> Dict[str, Any]:
+    """Compare the facet counters against a full recount"""
+    expected, actual = await asyncio.gather(compute_facet_counts(), facet_counters.read())
+    drift = _prune_zero_counts(_add_counts(actual, expected, sign=-1))
+    return {"consistent": not drift, "expected": expected, "actual": actual, "drift": drift}
+
+@app.on_event("startup")
+async def initialize_dashboard_counters():
+    """Build the counters once when a datastore has never had them"""
+    if storage_ready():
+        try:
+            if not await dashboard_counters.exists():
+                await rebuild_dashboard_counters()
+            if not await facet_counters.exists():
+                await rebuild_facet_counts()
+        except Exception as e:
+            print(f"❌ Error initializing dashboard counters: {e}")
+
+# =============================
+# LIVE COLLECTION REPLICA
+# =============================
+
+ENABLE_COLLECTION_REPLICA = os.getenv("ENABLE_COLLECTION_REPLICA", "false").lower() in ("1", "true", "yes")
+REPLICATED_COLLECTIONS = ("users", "hospitals", "slaughterhouses", "feedbacks")
+DATETIME_FIELDS = ("created_at", "updated_at", "last_login", "timestamp")
+
+def normalize_datetimes(doc: Dict[str, Any], fields=DATETIME_FIELDS) -> Dict[str, Any]:
+    """Convert datetime fields to ISO strings the way the list endpoints return them"""
+    for field in fields:
+        if isinstance(doc.get(field), datetime):
+            doc[field] = doc[field].isoformat()
+    return doc
+
+def matches_filters(doc: Dict[str, Any], filters: Optional[List[tuple]]) -> bool:
+    """Evaluate Firestore-style (field, op, value) filters against an in-memory document"""
+    for field, op, expected in filters or []:
+        actual = doc.get(field)
+        if isinstance(expected, datetime):
+            actual, expected = parse_timestamp(actual), parse_timestamp(expected)
+        if op == "==":
+            ok = actual == expected
+        elif op == "!=":
+            ok = actual != expected
+        elif op == "in":
+            ok = actual in expected
+        elif op == "array_contains":
+            ok = isinstance(actual, list) and expected in actual
+        elif actual is None:
+            ok = False
+        else:
+            try:
+                ok = {"<": actual < expected, "<=": actual <= expected,
+                      ">": actual > expected, ">=": actual >= expected}[op]
+            except TypeError:
+                ok = False
+        if not ok:
+            return False
+    return True
+
+class CollectionReplica:
+    """In-process copy of one collection, kept current by a snapshot listener.
+
+    Status moves stopped -> warming -> ready once the listener has delivered
+    the initial snapshot; callers should fall back to direct reads until then.
+    """
+
+    def __init__(self, collection: str, lookup_fields=()):
+        self.collection = collection
+        self.lookup_fields = lookup_fields
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.lookups: Dict[str, Dict[Any, str]] = {field: {} for field in lookup_fields}
+        self.status = "stopped"
+        self.error: Optional[str] = None
+        self.last_change_at: Optional[str] = None
+        self._lock = threading.Lock()
+        self._handle = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def start(self):
+        self.status = "warming"
+        try:
+            self._handle = store.watch(self.collection, self._apply)
+        except Exception as e:
+            self.status = "error"
+            self.error = str(e)
+            print(f"❌ Replica for {self.collection} could not start: {e}")
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.unsubscribe()
+            self._handle = None
+        self.status = "stopped"
+
+    def _apply(self, changes):
+        """Listener callback (runs on the listener thread)"""
+        with self._lock:
+            for kind, doc_id, data in changes:
+                previous = self.docs.pop(doc_id, None)
+                if previous:
+                    for field in self.lookup_fields:
+                        self.lookups[field].pop(previous.get(field), None)
+                if kind != "removed":
+                    doc = normalize_datetimes(data)
+                    self.docs[doc_id] = doc
+                    for field in self.lookup_fields:
+                        if doc.get(field) is not None:
+                            self.lookups[field][doc[field]] = doc_id
+            self.last_change_at = datetime.now().isoformat()
+        # Listener changes include writes from other processes and clients
+        bump_collection_version(self.collection)
+        self.status = "ready"
+
+    def values(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(doc) for doc in self.docs.values()]
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            doc = self.docs.get(doc_id)
+            return dict(doc) if doc else None
+
+    def find_one(self, field: str, value: Any) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            doc_id = self.lookups[field].get(value)
+            return dict(self.docs[doc_id]) if doc_id in self.docs else None
+
+    def count(self, filters: Optional[List[tuple]] = None) -> int:
+        with self._lock:
+            return sum(1 for doc in self.docs.values() if matches_filters(doc, filters))
+
+    def page(self, filters: Optional[List[tuple]], sort_field: str, descending: bool,
+             limit: int, start_after: Optional[List[Any]] = None) -> List[Dict[str, Any]]:
+        """Same ordering and cursor semantics as Repository.query on (sort_field, id)"""
+        def sort_key(doc):
+            return (doc[sort_field], doc["id"])
+        
+        with self._lock:
+            docs = [
+                doc for doc in self.docs.values()
+                if doc.get(sort_field) is not None and matches_filters(doc, filters)
+            ]
+        docs.sort(key=sort_key, reverse=descending)
+        if start_after:
+            # Replica documents hold ISO strings, so compare cursors the same way
+            bound = tuple(v.isoformat() if isinstance(v, datetime) else v for v in start_after)
+            docs = [doc for doc in docs if (sort_key(doc) < bound if descending else sort_key(doc) > bound)]
+        return [dict(doc) for doc in docs[:limit]]
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "documents": len(self.docs),
+            "last_change_at": self.last_change_at,
+            "error": self.error
+        }
+
+replicas: Dict[str, CollectionReplica] = {
+    "users": CollectionReplica("users", lookup_fields=("email",)),
+    "hospitals": CollectionReplica("hospitals"),
+    "slaughterhouses": CollectionReplica("slaughterhouses"),
+    "feedbacks": CollectionReplica("feedbacks"),
+}
+
+def ready_replica(collection: str) -> Optional[CollectionReplica]:
+    """The replica for a collection if it can serve reads right now"""
+    replica = replicas.get(collection)
+    return replica if replica is not None and replica.ready else None
+
+@app.on_event("startup")
+async def start_collection_replicas():
+    """Attach snapshot listeners when the replica is enabled"""
+    if ENABLE_COLLECTION_REPLICA and storage_ready():
+        for replica in replicas.values():
+            replica.start()
+        print(f"✅ Collection replica warming: {', '.join(replicas)}")
+
+@app.on_event("shutdown")
+async def stop_collection_replicas():
+    for replica in replicas.values():
+        replica.stop()
+
+# =============================
+# FIELD PROJECTION
+# =============================
+
+# Fields that must never leave the datastore through a list endpoint
+SENSITIVE_FIELDS = {"password", "two_factor_secret"}
+
+# Default columns per collection (what the admin views render) and the
+# extra ones a client may ask for with ?fields=
+LIST_FIELDS = {
+    "users": {
+        "default": ["email", "full_name", "phone", "role", "business_name", "address", "status",
+                    "created_at", "last_login"],
+        "extra": ["updated_at", "updated_by"],
+    },
+    "hospitals": {
+        "default": ["name", "address", "contact", "phone", "email", "services", "doctors", "status",
+                    "operating_hours", "latitude", "longitude", "created_at"],
+        "extra": ["created_by", "updated_at", "updated_by"],
+    },
+    "slaughterhouses": {
+        "default": ["name", "address", "contact", "phone", "email", "capacity", "status",
+                    "operating_hours", "certification", "latitude", "longitude", "created_at"],
+        "extra": ["created_by", "updated_at", "updated_by"],
+    },
+    "feedbacks": {
+        "default": ["user_id", "user_name", "target_type", "target_id", "target_name", "rating", "comment",
+                    "status", "created_at"],
+        "extra": ["updated_at"],
+    },
+    "activities": {
+        "default": ["type", "user_id", "user_name", "details", "timestamp"],
+        "extra": ["created_at", "entity_type", "entity_id", "partition"],
+    },
+}
+
+def resolve_fields(collection: str, fields: Optional[str], sort_field: str) -> List[str]:
+    """Turn a ?fields=a,b,c parameter into a validated projection.
+
+    The sort field is always included because the page cursor is built from it.
+    """
+    spec = LIST_FIELDS[collection]
+    if not fields:
+        selected = list(spec["default"])
+    else:
+        selected = [field.strip() for field in fields.split(",") if field.strip()]
+        allowed = set(spec["default"]) | set(spec["extra"]) | {"id"}
+        rejected = [field for field in selected if field not in allowed or field in SENSITIVE_FIELDS]
+        if rejected:
+            raise HTTPException(status_code=400, detail=f"Unknown or restricted fields: {', '.join(rejected)}")
+    if sort_field not in selected:
+        selected.append(sort_field)
+    return selected
+
+# =============================
+# INDEXED QUERY PLANS
+# =============================
+
+# Every filter/sort combination the list endpoints accept. Each non-empty
+# equality set needs a composite index per sort field and direction;
+# firestore.indexes.json is generated from this table
+# (python main.py export-indexes) so the two cannot drift apart.
+INDEXED_QUERIES = {
+    "users": {
+        "equality": [(), ("role",), ("status",), ("role", "status")],
+        "sorts": ["created_at", "full_name", "email"],
+    },
+    "hospitals": {
+        "equality": [(), ("status",)],
+        "sorts": ["created_at", "name"],
+    },
+    "slaughterhouses": {
+        "equality": [(), ("status",)],
+        "sorts": ["created_at", "name"],
+    },
+    "feedbacks": {
+        "equality": [(), ("status",), ("target_type",), ("status", "target_type")],
+        "sorts": ["created_at", "rating"],
+    },
+    # Type-filtered pages the in-memory buffer cannot answer, and the
+    # per-user (array-contains on user_ids) and per-entity histories
+    "activities": {
+        "equality": [(), ("type",), ("user_ids",), ("entity_type", "entity_id")],
+        "arrays": ["user_ids"],
+        "sorts": ["timestamp"],
+    },
+    # Delta sync reads tombstones of one collection in deleted_at order
+    "tombstones": {
+        "equality": [("collection",)],
+        "sorts": ["deleted_at"],
+    },
+}
+
+def parse_sort(sort: Optional[str], default: str = "-created_at") -> tuple:
+    """'-created_at' -> ('created_at', True); 'name' -> ('name', False)"""
+    sort = (sort or default).strip()
+    return (sort[1:], True) if sort.startswith("-") else (sort, False)
+
+def equality_filters(**fields) -> List[tuple]:
+    """Build == filters from optional query parameters, skipping unset ones"""
+    return [(field, "==", value) for field, value in fields.items() if value is not None]
+
+def list_query(collection: str, filters: List[tuple], created_after: Optional[datetime],
+               sort: Optional[str]) -> tuple:
+    """Validate a list request against INDEXED_QUERIES; returns (filters, sort_field, descending)"""
+    sort_field, descending = parse_sort(sort)
+    check_indexed_query(collection, filters, sort_field, "created_at" if created_after else None)
+    if created_after:
+        filters = filters + [("created_at", ">", created_after)]
+    return filters, sort_field, descending
+
+def check_indexed_query(collection: str, filters: List[tuple], sort_field: str,
+                        range_field: Optional[str] = None):
+    """Reject filter/sort combinations that have no declared index"""
+    plan = INDEXED_QUERIES[collection]
+    equality = tuple(sorted(field for field, op, _ in filters if op in ("==", "array_contains")))
+    if sort_field not in plan["sorts"]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cannot sort {collection} by '{sort_field}'. Allowed: {', '.join(plan['sorts'])}"
+        )
+    if equality not in [tuple(sorted(combo)) for combo in plan["equality"]]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported filter combination for {collection}: {', '.join(equality)}"
+        )
+    if range_field and range_field != sort_field:
+        # Firestore needs the first ordering on the range-filtered field
+        raise HTTPException(
+            status_code=400,
+            detail=f"A {range_field} range can only be combined with sort={range_field} or -{range_field}"
+        )
+
+def firestore_index_definitions() -> Dict[str, Any]:
+    """Composite index definitions for firestore.indexes.json"""
+    indexes = []
+    for collection, plan in INDEXED_QUERIES.items():
+        for equality in plan["equality"]:
+            if not equality:
+                continue  # single-field indexes are automatic
+            for sort_field in plan["sorts"]:
+                for order in ("ASCENDING", "DESCENDING"):
+                    indexes.append({
+                        "collectionGroup": collection,
+                        "queryScope": "COLLECTION",
+                        "fields": [{"fieldPath": field, "arrayConfig": "CONTAINS"} if field in plan.get("arrays", ())
+                                   else {"fieldPath": field, "order": "ASCENDING"} for field in equality]
+                                  + [{"fieldPath": sort_field, "order": order}]
+                    })
+    return {"indexes": indexes, "fieldOverrides": []}
+
+# =============================
+# CURSOR PAGINATION
+# =============================
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+
+def encode_cursor(sort_field: str, values: List[Any]) -> str:
+    """Opaque cursor for the last (sort value, id) of a page"""
+    encoded = [{"$dt": v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    payload = json.dumps({"s": sort_field, "v": encoded}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort_field: str) -> List[Any]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        values = [
+            datetime.fromisoformat(v["$dt"]) if isinstance(v, dict) and "$dt" in v else v
+            for v in payload["v"]
+        ]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if payload.get("s") != sort_field or len(values) != 2:
+        raise HTTPException(status_code=400, detail="Cursor does not belong to this listing")
+    return values
+
+async def fetch_page(repo: Repository, sort_field: str, page_size: int, cursor: Optional[str] = None,
+                     filters: Optional[List[tuple]] = None, descending: bool = True,
+                     fields: Optional[List[str]] = None):
+    """Fetch one page ordered by (sort_field, id) and the cursor for the next one.
+
+    Returns (documents, next_cursor); next_cursor is None on the last page.
+    """
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    start_after = decode_cursor(cursor, sort_field) if cursor else None
+    
+    replica = ready_replica(repo.collection)
+    if replica:
+        docs = replica.page(filters, sort_field, descending, page_size + 1, start_after)
+        docs = [project_fields(doc, fields) for doc in docs]
+    else:
+        docs = await repo.query(filters, order_by=[sort_field, "id"], descending=descending,
+                                limit=page_size + 1, start_after=start_after, fields=fields)
+    
+    next_cursor = None
+    if len(docs) > page_size:
+        docs = docs[:page_size]
+        next_cursor = encode_cursor(sort_field, [docs[-1].get(sort_field), docs[-1]["id"]])
+    return docs, next_cursor
+
+# =============================
+# FULL-TEXT SEARCH INDEX
+# =============================
+
+ENABLE_SEARCH_INDEX = os.getenv("ENABLE_SEARCH_INDEX", "true").lower() in ("1", "true", "yes")
+
+# Searchable fields and their ranking weight; the first field is the typeahead label
+SEARCH_FIELDS = {
+    "hospitals": {"name": 3, "services": 2, "address": 1},
+    "slaughterhouses": {"name": 3, "certification": 2, "address": 1},
+    "users": {"full_name": 3, "email": 2, "business_name": 2},
+}
+# Returned with each hit so results render without another read
+SEARCH_DISPLAY_FIELDS = {
+    "hospitals": ["status"],
+    "slaughterhouses": ["status"],
+    "users": ["role", "status"],
+}
+SEARCH_PREFIX_EXPANSION = 200  # vocabulary entries a prefix term may expand to
+SEARCH_PREFIX_WEIGHT = 0.5     # a prefix hit counts half as much as an exact token
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+def tokenize(value) -> List[str]:
+    """Lowercase word tokens of a string or list of strings"""
+    if isinstance(value, list):
+        value = " ".join(str(item) for item in value if item is not None)
+    return TOKEN_PATTERN.findall(str(value).lower()) if value else []
+
+class SearchIndex:
+    """Inverted index over the searchable fields of one collection.
+
+    Postings map token -> {doc_id: field weight}; a sorted vocabulary turns
+    prefix terms into a bisect range. The index is built by one scan at
+    startup and then follows writes made through this process via on_write.
+    """
+
+    def __init__(self, collection: str):
+        self.collection = collection
+        self.weights = SEARCH_FIELDS[collection]
+        self.label_field = next(iter(self.weights))
+        self.stored_fields = list(self.weights) + SEARCH_DISPLAY_FIELDS.get(collection, [])
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.vocabulary: List[str] = []
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.status = "stopped"
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._touched: Optional[set] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def _doc_tokens(self, doc: Dict[str, Any]) -> Dict[str, int]:
+        tokens: Dict[str, int] = {}
+        for field, weight in self.weights.items():
+            for token in tokenize(doc.get(field)):
+                tokens[token] = max(tokens.get(token, 0), weight)
+        return tokens
+
+    def _remove(self, doc_id: str):
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return
+        for token in self._doc_tokens(doc):
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(doc_id, None)
+            if not posting:
+                del self.postings[token]
+                position = bisect.bisect_left(self.vocabulary, token)
+                if position < len(self.vocabulary) and self.vocabulary[position] == token:
+                    del self.vocabulary[position]
+
+    def _add(self, doc_id: str, doc: Dict[str, Any], keep_sorted: bool = True):
+        stored = {field: doc[field] for field in self.stored_fields if doc.get(field) is not None}
+        self.docs[doc_id] = stored
+        for token, weight in self._doc_tokens(stored).items():
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = {}
+                if keep_sorted:
+                    bisect.insort(self.vocabulary, token)
+            posting[doc_id] = weight
+
+    def apply(self, op: WriteOp):
+        """Follow one committed write"""
+        with self._lock:
+            if self._touched is not None:
+                self._touched.add(op.doc_id)
+            if op.kind == "delete":
+                self._remove(op.doc_id)
+            elif op.kind == "set" and not op.merge:
+                self._remove(op.doc_id)
+                self._add(op.doc_id, op.data)
+            elif op.kind in ("set", "update") and any(field in op.data for field in self.stored_fields):
+                merged = {**self.docs.get(op.doc_id, {}), **op.data}
+                self._remove(op.doc_id)
+                self._add(op.doc_id, merged)
 
-async def get_all_slaughterhouses():
-    """Get all slaughterhouses from Firestore"""
-    if not firebase_initialized or not db:
-        return []
-    
-    try:
-        slaughterhouses_ref = db.collection("slaughterhouses")
-        docs = slaughterhouses_ref.stream()
-        
-        slaughterhouses = []
+    def build(self, docs: List[Dict[str, Any]]):
+        """Index a full scan (runs on the db executor); writes seen meanwhile win"""
         for doc in docs:
-            slaughterhouse_data = doc.to_dict()
-            slaughterhouse_data["id"] = doc.id
-            if "created_at" in slaughterhouse_data and slaughterhouse_data["created_at"]:
-                if isinstance(slaughterhouse_data["created_at"], datetime):
-                    slaughterhouse_data["created_at"] = slaughterhouse_data["created_at"].isoformat()
-            slaughterhouses.append(slaughterhouse_data)
-        
-        return slaughterhouses
-    except Exception as e:
-        print(f"❌ Error fetching slaughterhouses: {e}")
-        return []
+            with self._lock:
+                if doc["id"] not in self._touched and doc["id"] not in self.docs:
+                    self._add(doc["id"], doc, keep_sorted=False)
+        with self._lock:
+            self.vocabulary = sorted(self.postings)
 
-async def get_recent_activities(limit: int = 20):
-    """Get recent activities from Firestore"""
-    if not firebase_initialized or not db:
-        return []
-    
-    try:
-        activities_ref = db.collection("activities").order_by(
-            "timestamp", direction=firestore.Query.DESCENDING
-        ).limit(limit)
-        docs = activities_ref.stream()
-        
-        activities = []
-        for doc in docs:
-            activity_data = doc.to_dict()
-            activity_data["id"] = doc.id
-            # Convert timestamp to ISO format
-            if "timestamp" in activity_data and activity_data["timestamp"]:
-                if isinstance(activity_data["timestamp"], datetime):
-                    activity_data["timestamp"] = activity_data["timestamp"].isoformat()
-            if "created_at" in activity_data and activity_data["created_at"]:
-                if isinstance(activity_data["created_at"], datetime):
-                    activity_data["created_at"] = activity_data["created_at"].isoformat()
-            activities.append(activity_data)
-        
-        return activities
-    except Exception as e:
-        print(f"❌ Error fetching activities: {e}")
-        return []
+    async def start(self):
+        self.status = "warming"
+        with self._lock:
+            self._touched = set()
+        try:
+            docs = await Repository(self.collection).query(fields=self.stored_fields)
+            await run_db(self.build, docs)
+            self.status = "ready"
+            print(f"✅ Search index ready for {self.collection}: {len(self.docs)} documents")
+        except Exception as e:
+            self.status = "error"
+            self.error = str(e)
+            print(f"❌ Search index for {self.collection} could not be built: {e}")
+        finally:
+            with self._lock:
+                self._touched = None
+
+    def _term_scores(self, term: str, candidates: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+        """Scores for one term (exact token or prefix), restricted to candidates when given"""
+        start = bisect.bisect_left(self.vocabulary, term)
+        scores: Dict[str, float] = {}
+        for token in self.vocabulary[start:start + SEARCH_PREFIX_EXPANSION]:
+            if not token.startswith(term):
+                break
+            factor = 1.0 if token == term else SEARCH_PREFIX_WEIGHT
+            posting = self.postings[token]
+            if candidates is not None and len(candidates) < len(posting):
+                entries = ((doc_id, posting[doc_id]) for doc_id in candidates if doc_id in posting)
+            else:
+                entries = posting.items()
+            for doc_id, weight in entries:
+                scores[doc_id] = max(scores.get(doc_id, 0.0), weight * factor)
+        return scores
+
+    def search(self, query: str, offset: int = 0, limit: int = 20) -> tuple:
+        """Rank documents matching every query term; returns (total, hits)"""
+        # Longer terms are usually more selective, so they narrow the candidates first
+        terms = sorted(set(tokenize(query)), key=len, reverse=True)
+        if not terms:
+            return 0, []
+        with self._lock:
+            matched: Optional[Dict[str, float]] = None
+            for term in terms:
+                scores = self._term_scores(term, matched)
+                if matched is None:
+                    matched = scores
+                else:
+                    matched = {doc_id: score + scores[doc_id] for doc_id, score in matched.items() if doc_id in scores}
+                if not matched:
+                    return 0, []
+            ranked = heapq.nsmallest(offset + limit, matched.items(), key=lambda item: (-item[1], item[0]))
+            hits = [
+                {"id": doc_id, **self.docs[doc_id], "score": round(score, 2)}
+                for doc_id, score in ranked[offset:]
+            ]
+        return len(matched), hits
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "documents": len(self.docs),
+            "tokens": len(self.postings),
+            "error": self.error
+        }
+
+search_indexes: Dict[str, SearchIndex] = {collection: SearchIndex(collection) for collection in SEARCH_FIELDS}
+
+@on_write
+def update_search_indexes(operations: List[WriteOp]):
+    for op in operations:
+        index = search_indexes.get(op.collection)
+        if index is not None and index.status != "stopped":
+            index.apply(op)
+
+@app.on_event("startup")
+async def start_search_indexes():
+    """Build the search indexes in the background; searches return 503 until ready"""
+    if ENABLE_SEARCH_INDEX and storage_ready():
+        for index in search_indexes.values():
+            asyncio.create_task(index.start())
+
+def ready_search_index(collection: str) -> SearchIndex:
+    if collection not in search_indexes:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No search index for '{collection}'. Available: {', '.join(search_indexes)}"
+        )
+    index = search_indexes[collection]
+    if not index.ready:
+        raise HTTPException(status_code=503, detail=f"Search index for {collection} is {index.status}")
+    return index
 
 # =============================
-# USER SETTINGS FUNCTIONS
+# GEOSPATIAL FACILITY INDEX
 # =============================
 
-async def get_user_settings(user_id: str):
-    """Get user settings from Firestore"""
-    if not firebase_initialized or not db:
-        return None
-    
-    try:
-        settings_ref = db.collection("user_settings").document(user_id)
-        settings_doc = settings_ref.get()
-        
-        if settings_doc.exists:
-            settings_data = settings_doc.to_dict()
-            return settings_data
-        else:
-            # Return default settings if not found
-            default_settings = {
-                "theme": "light",
-                "language": "english",
-                "notifications": True,
-                "sounds": True,
-                "auto_save": True,
-                "two_factor_auth": False,
-                "created_at": datetime.now(),
-                "updated_at": datetime.now(),
-                "user_id": user_id
-            }
-            # Save default settings
-            settings_ref.set(default_settings)
-            return default_settings
-    except Exception as e:
-        print(f"❌ Error fetching user settings: {e}")
-        return None
+GEO_CELL_DEGREES = float(os.getenv("GEO_CELL_DEGREES", "0.1"))  # ~11 km cells
+GEO_MAX_RINGS = int(os.getenv("GEO_MAX_RINGS", "50"))  # beyond this a linear scan is cheaper
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+GEO_COLLECTIONS = {"hospitals": "hospital", "slaughterhouses": "slaughterhouse"}
+GEO_STORED_FIELDS = ["name", "address", "phone", "status", "latitude", "longitude"]
 
-async def update_user_settings(user_id: str, settings_data: dict):
-    """Update user settings in Firestore"""
-    if not firebase_initialized or not db:
-        raise HTTPException(status_code=503, detail="Firebase not initialized")
-    
+def coordinates(latitude, longitude) -> Dict[str, float]:
+    """Validated latitude/longitude fields for a facility document ({} when both unset)"""
+    if latitude is None and longitude is None:
+        return {}
     try:
-        settings_ref = db.collection("user_settings").document(user_id)
-        
-        # Add metadata
-        settings_data["updated_at"] = datetime.now()
-        settings_data["user_id"] = user_id
-        
-        # Update or create settings
-        settings_ref.set(settings_data, merge=True)
-        print(f"✅ Settings updated for user: {user_id}")
-        
-        return settings_data
-    except Exception as e:
-        print(f"❌ Error updating user settings: {e}")
-        raise HTTPException(status_code=500, detail=f"Error updating settings: {str(e)}")
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="latitude and longitude must be given together as numbers")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise HTTPException(status_code=400, detail="latitude/longitude out of range")
+    return {"latitude": latitude, "longitude": longitude}
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+class GeoIndex:
+    """Uniform lat/lng grid over the facilities of one collection.
+
+    Nearest-neighbour queries walk rings of cells outwards from the query
+    point and stop as soon as no unvisited cell can hold anything closer
+    than the current k-th result (or the radius is exceeded). Longitude
+    columns wrap at the antimeridian; sparse data that would need more than
+    GEO_MAX_RINGS rings falls back to a linear scan. Built and maintained
+    like SearchIndex: one startup scan, then on_write.
+    """
+
+    def __init__(self, collection: str, cell_degrees: float = GEO_CELL_DEGREES):
+        self.collection = collection
+        self.facility_type = GEO_COLLECTIONS[collection]
+        self.cell_degrees = cell_degrees
+        # Whole number of columns around the globe, each at least cell_degrees wide
+        self.columns = max(1, math.floor(360 / cell_degrees))
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.cells: Dict[tuple, Dict[str, Dict[str, Any]]] = {}
+        self.locations: Dict[str, tuple] = {}
+        self.status = "stopped"
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._touched: Optional[set] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def _cell(self, latitude: float, longitude: float) -> tuple:
+        column = math.floor((longitude + 180) / 360 * self.columns) % self.columns
+        return (math.floor(latitude / self.cell_degrees), column)
+
+    def _remove(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        cell = self.locations.pop(doc_id, None)
+        if cell is not None:
+            self.cells[cell].pop(doc_id)
+            if not self.cells[cell]:
+                del self.cells[cell]
+        return self.docs.pop(doc_id, None)
+
+    def _add(self, doc_id: str, doc: Dict[str, Any]):
+        # Facilities without coordinates are kept too, so a later update adding them has the rest
+        stored = {field: doc[field] for field in GEO_STORED_FIELDS if doc.get(field) is not None}
+        self.docs[doc_id] = stored
+        if not isinstance(stored.get("latitude"), (int, float)) or not isinstance(stored.get("longitude"), (int, float)):
+            return
+        cell = self._cell(stored["latitude"], stored["longitude"])
+        self.cells.setdefault(cell, {})[doc_id] = stored
+        self.locations[doc_id] = cell
+
+    def apply(self, op: WriteOp):
+        """Follow one committed write"""
+        with self._lock:
+            if self._touched is not None:
+                self._touched.add(op.doc_id)
+            if op.kind == "delete":
+                self._remove(op.doc_id)
+            elif op.kind == "set" and not op.merge:
+                self._remove(op.doc_id)
+                self._add(op.doc_id, op.data)
+            elif op.kind in ("set", "update") and any(field in op.data for field in GEO_STORED_FIELDS):
+                previous = self._remove(op.doc_id) or {}
+                self._add(op.doc_id, {**previous, **op.data})
+
+    def build(self, docs: List[Dict[str, Any]]):
+        """Index a full scan (runs on the db executor); writes seen meanwhile win"""
+        for doc in docs:
+            with self._lock:
+                if doc["id"] not in self._touched and doc["id"] not in self.docs:
+                    self._add(doc["id"], doc)
+
+    async def start(self):
+        self.status = "warming"
+        with self._lock:
+            self._touched = set()
+        try:
+            docs = await Repository(self.collection).query(fields=GEO_STORED_FIELDS)
+            await run_db(self.build, docs)
+            self.status = "ready"
+            print(f"✅ Geo index ready for {self.collection}: {len(self.locations)} located facilities")
+        except Exception as e:
+            self.status = "error"
+            self.error = str(e)
+            print(f"❌ Geo index for {self.collection} could not be built: {e}")
+        finally:
+            with self._lock:
+                self._touched = None
+
+    def _ring(self, center: tuple, ring: int):
+        row, col = center
+        if ring == 0:
+            yield center
+            return
+        cells = set()
+        for offset in range(-ring, ring + 1):
+            cells.add((row - ring, (col + offset) % self.columns))
+            cells.add((row + ring, (col + offset) % self.columns))
+        for offset in range(-ring + 1, ring):
+            cells.add((row + offset, (col - ring) % self.columns))
+            cells.add((row + offset, (col + ring) % self.columns))
+        for cell in cells:
+            # Wide rings wrap round the globe; skip columns a smaller ring already reached
+            shift = (cell[1] - col) % self.columns
+            if max(abs(cell[0] - row), min(shift, self.columns - shift)) == ring:
+                yield cell
+
+    def nearest(self, latitude: float, longitude: float, k: int,
+                radius_km: Optional[float] = None, status: Optional[str] = None) -> List[tuple]:
+        """Up to k (distance_km, doc_id, doc) tuples ordered by distance"""
+        center = self._cell(latitude, longitude)
+        # Smallest width of a cell in km near the query point (cells narrow towards the poles)
+        max_latitude = min(89.9, abs(latitude) + self.cell_degrees)
+        cell_km = self.cell_degrees * KM_PER_DEGREE * math.cos(math.radians(max_latitude))
+        best: List[tuple] = []  # max-heap of (-distance, doc_id, doc)
+
+        def consider(doc_id: str, doc: Dict[str, Any]):
+            if status and doc.get("status") != status:
+                return
+            distance = haversine_km(latitude, longitude, doc["latitude"], doc["longitude"])
+            if radius_km is not None and distance > radius_km:
+                return
+            entry = (-distance, doc_id, doc)
+            if len(best) < k:
+                heapq.heappush(best, entry)
+            elif entry > best[0]:
+                heapq.heapreplace(best, entry)
+
+        with self._lock:
+            remaining = len(self.locations)
+            ring = 0
+            while remaining > 0:
+                if ring > GEO_MAX_RINGS:
+                    best = []
+                    for doc_id, cell in self.locations.items():
+                        consider(doc_id, self.cells[cell][doc_id])
+                    break
+                # Anything in ring n is at least (n - 1) cell widths away
+                bound = max(0, ring - 1) * cell_km
+                if radius_km is not None and bound > radius_km:
+                    break
+                if len(best) >= k and bound > -best[0][0]:
+                    break
+                for cell in self._ring(center, ring):
+                    for doc_id, doc in self.cells.get(cell, {}).items():
+                        remaining -= 1
+                        consider(doc_id, doc)
+                ring += 1
+            results = [(-negative, doc_id, dict(doc)) for negative, doc_id, doc in best]
+        return sorted(results, key=lambda item: (item[0], item[1]))
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "located_facilities": len(self.locations),
+            "cells": len(self.cells),
+            "error": self.error
+        }
+
+geo_indexes: Dict[str, GeoIndex] = {collection: GeoIndex(collection) for collection in GEO_COLLECTIONS}
+
+@on_write
+def update_geo_indexes(operations: List[WriteOp]):
+    for op in operations:
+        index = geo_indexes.get(op.collection)
+        if index is not None and index.status != "stopped":
+            index.apply(op)
+
+@app.on_event("startup")
+async def start_geo_indexes():
+    if storage_ready():
+        for index in geo_indexes.values():
+            asyncio.create_task(index.start())
 
 # =============================
 # DASHBOARD ANALYTICS
 # =============================
 
+@coalesced()
 async def get_dashboard_stats():
     """Get comprehensive dashboard statistics"""
     
-    if not firebase_initialized or not db:
+    if not storage_ready():
         return {
             "total_users": 0,
             "total_farmers": 0,
@@ -622,68 +3159,31 @@ async def get_dashboard_stats():
         }
     
     try:
-        # Get all collections
-        users = await get_all_users()
-        hospitals = await get_all_hospitals()
-        slaughterhouses = await get_all_slaughterhouses()
-        activities = await get_recent_activities(10)
-        
-        # Get feedbacks
-        total_feedbacks = 0
-        pending_feedbacks = 0
-        try:
-            feedbacks_ref = db.collection("feedbacks")
-            feedbacks_docs = list(feedbacks_ref.stream())
-            total_feedbacks = len(feedbacks_docs)
-            pending_feedbacks = sum(1 for doc in feedbacks_docs if doc.to_dict().get("status") == "new")
-        except:
-            pass
+        # One query over the counter shards instead of scanning every collection
+        counters, activities = await asyncio.gather(
+            dashboard_counters.read(),
+            get_recent_activities(10)
+        )
         
-        # Count by role
-        total_users = len(users)
-        farmers = [u for u in users if u.get("role") == "farmer"]
-        veterinarians = [u for u in users if u.get("role") == "veterinarian"]
-        slaughter_users = [u for u in users if u.get("role") == "slaughterhouse"]
+        total_feedbacks = counters.get("total_feedbacks", 0)
+        pending_feedbacks = counters.get("feedbacks_by_status", {}).get("new", 0)
         
-        # Calculate last month users - FIXED TIMEZONE ISSUE
-        from datetime import timezone
+        # Count by role
+        users_by_role = counters.get("users_by_role", {})
+        total_users = counters.get("total_users", 0)
+        farmers = users_by_role.get("farmer", 0)
+        veterinarians = users_by_role.get("veterinarian", 0)
+        slaughter_users = users_by_role.get("slaughterhouse", 0)
         
-        # Use timezone-aware datetime for comparison
+        # Calculate last month users from the daily signup buckets
         current_time = datetime.now(timezone.utc)
-        one_month_ago = current_time - timedelta(days=30)
-        
-        last_month_users = 0
-        for user in users:
-            created_at = user.get("created_at")
-            if created_at:
-                try:
-                    if isinstance(created_at, str):
-                        # Parse string to datetime
-                        if created_at.endswith('Z'):
-                            created_at_dt = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                        else:
-                            created_at_dt = datetime.fromisoformat(created_at)
-                    elif isinstance(created_at, datetime):
-                        created_at_dt = created_at
-                    else:
-                        continue
-                    
-                    # Make sure datetime is timezone-aware
-                    if created_at_dt.tzinfo is None:
-                        created_at_dt = created_at_dt.replace(tzinfo=timezone.utc)
-                    
-                    # Now compare with timezone-aware datetime
-                    if created_at_dt >= one_month_ago:
-                        last_month_users += 1
-                except Exception as e:
-                    # If there's any error, skip this user
-                    continue
+        last_month_users = sum(_recent_signup_buckets(counters).get("signups_by_day", {}).values())
         
         # Calculate percentages
         if total_users > 0:
-            farmer_percent = (len(farmers) / total_users) * 100
-            vet_percent = (len(veterinarians) / total_users) * 100
-            slaughter_percent = (len(slaughter_users) / total_users) * 100
+            farmer_percent = (farmers / total_users) * 100
+            vet_percent = (veterinarians / total_users) * 100
+            slaughter_percent = (slaughter_users / total_users) * 100
         else:
             farmer_percent = vet_percent = slaughter_percent = 0
         
@@ -695,7 +3195,8 @@ async def get_dashboard_stats():
             
             action_map = {
                 "user_registered": f"New {details.get('role', 'user')} registered",
-                "user_login": "User logged in",
+                "user_login": (f"{details['count']} logins in the last {_window_text(details)}"
+                               if details.get("rollup") else "User logged in"),
                 "hospital_added": f"Hospital '{details.get('hospital_name', 'Unknown')}' added",
                 "hospital_updated": f"Hospital '{details.get('hospital_name', 'Unknown')}' updated",
                 "hospital_deleted": f"Hospital '{details.get('hospital_name', 'Unknown')}' deleted",
@@ -703,9 +3204,13 @@ async def get_dashboard_stats():
                 "slaughterhouse_updated": f"Slaughterhouse '{details.get('slaughterhouse_name', 'Unknown')}' updated",
                 "slaughterhouse_deleted": f"Slaughterhouse '{details.get('slaughterhouse_name', 'Unknown')}' deleted",
                 "feedback_submitted": f"Feedback submitted for {details.get('target_name', 'Unknown')}",
+                "feedback_updated": f"Feedback for {details.get('target_name', 'Unknown')} marked {details.get('status', 'updated')}",
                 "user_updated": "User profile updated",
                 "user_deleted": "User account deleted",
-                "settings_updated": f"Settings updated by {activity.get('user_name', 'User')}",
+                "facilities_imported": f"{details.get('imported', 0)} {details.get('collection', 'facilities')} imported",
+                "batch_applied": f"Batch of {details.get('succeeded', 0)} admin changes applied",
+                "settings_updated": (f"{details['count']} settings updates in the last {_window_text(details)}"
+                                     if details.get("rollup") else f"Settings updated by {activity.get('user_name', 'User')}"),
                 "two_factor_enabled": f"Two-factor authentication enabled by {activity.get('user_name', 'User')}",
                 "two_factor_disabled": f"Two-factor authentication disabled by {activity.get('user_name', 'User')}",
                 "password_reset": f"Password reset by {activity.get('user_name', 'User')}"
@@ -759,11 +3264,11 @@ async def get_dashboard_stats():
         
         return {
             "total_users": total_users,
-            "total_farmers": len(farmers),
-            "total_veterinarians": len(veterinarians),
-            "total_slaughterhouses": len(slaughter_users),
-            "total_hospitals": len(hospitals),
-            "total_slaughterhouse_facilities": len(slaughterhouses),
+            "total_farmers": farmers,
+            "total_veterinarians": veterinarians,
+            "total_slaughterhouses": slaughter_users,
+            "total_hospitals": counters.get("total_hospitals", 0),
+            "total_slaughterhouse_facilities": counters.get("total_slaughterhouse_facilities", 0),
             "total_feedbacks": total_feedbacks,
             "pending_feedbacks": pending_feedbacks,
             "last_month_users": last_month_users,
@@ -800,6 +3305,65 @@ async def get_dashboard_stats():
             "firebase_status": "error"
         }
 
+# =============================
+# SHARED DASHBOARD SNAPSHOT
+# =============================
+
+DASHBOARD_SNAPSHOT_TTL = float(os.getenv("DASHBOARD_SNAPSHOT_TTL", "30"))
+
+class DashboardSnapshot:
+    """Process-wide dashboard stats and recent activities.
+
+    Readers get the current snapshot immediately (stale-while-revalidate);
+    only the very first read waits for a build. Expiry and invalidate()
+    schedule at most one background refresh at a time, however many
+    clients are asking.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.data: Optional[Dict[str, Any]] = None
+        self.refreshed_at = 0.0
+        self.stale = True
+        self.stamp: Dict[str, int] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def get(self) -> Dict[str, Any]:
+        if self.data is None:
+            await self._schedule_refresh()
+        elif self.stale or time.monotonic() - self.refreshed_at > self.ttl:
+            self._schedule_refresh()
+        return self.data
+
+    def invalidate(self):
+        self.stale = True
+        self._schedule_refresh()
+
+    def _schedule_refresh(self) -> asyncio.Task:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+        return self._refresh_task
+
+    async def _refresh(self):
+        # Cleared first so writes landing mid-refresh mark the result stale again
+        self.stale = False
+        stamp = version_stamp(STATS_COLLECTIONS)
+        try:
+            stats, recent_activities = await asyncio.gather(
+                get_dashboard_stats(),
+                get_recent_activities(10)
+            )
+            self.data = {"stats": stats, "recent_activities": recent_activities}
+            self.stamp = stamp
+            self.refreshed_at = time.monotonic()
+        except Exception as e:
+            self.stale = True
+            print(f"❌ Error refreshing dashboard snapshot: {e}")
+            if self.data is None:
+                raise
+
+dashboard_snapshot = DashboardSnapshot(DASHBOARD_SNAPSHOT_TTL)
+
 # =============================
 # API ENDPOINTS
 # =============================
@@ -811,6 +3375,7 @@ async def root():
         "version": "5.0.0",
         "status": "active",
         "firebase": "connected" if firebase_initialized else "not_initialized",
+        "storage": store.name if store else "not_initialized",
         "endpoints": {
             "auth": "/api/auth/login, /api/auth/signup",
             "password_reset": "/api/auth/forgot-password, /api/auth/verify-otp, /api/auth/reset-password",
@@ -818,6 +3383,10 @@ async def root():
             "hospitals": "/api/admin/hospitals",
             "slaughterhouses": "/api/admin/slaughterhouses",
             "users": "/api/admin/users",
+            "search": "/api/admin/search/{collection}?q=, /api/admin/search/{collection}/typeahead?q=",
+            "nearest": "/api/facilities/nearest?lat=&lng=&k=&radius_km=&status=Active",
+            "export": "/api/admin/export/{collection}?format=ndjson|csv",
+            "import": "/api/admin/import/{hospitals|slaughterhouses} (CSV or NDJSON body)",
             "feedback": "/api/feedback",
             "settings": "/api/user/settings",
             "two_factor_auth": "/api/user/two-factor-auth",
@@ -831,8 +3400,32 @@ async def health_check():
     return {
         "status": "healthy",
         "firebase": "connected" if firebase_initialized else "not_initialized",
+        "storage": store.name if store else "not_initialized",
         "timestamp": datetime.now().isoformat(),
-        "websocket_connections": len(manager.active_connections)
+        "websocket_connections": len(manager.active_connections),
+        "replica": {name: replica.status for name, replica in replicas.items()},
+        "search": {name: index.status for name, index in search_indexes.items()},
+        "geo": {name: index.describe() for name, index in geo_indexes.items()}
+    }
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Internal performance counters"""
+    return {
+        "single_flight": single_flight.snapshot(),
+        "compression": compression_stats.snapshot(),
+        "activity_queue": activity_queue.snapshot(),
+        "activity_buffer": recent_activities.snapshot(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/api/replica/status")
+async def replica_status():
+    """Readiness of the in-memory collection replica"""
+    return {
+        "enabled": ENABLE_COLLECTION_REPLICA,
+        "ready": all(replica.ready for replica in replicas.values()),
+        "collections": {name: replica.describe() for name, replica in replicas.items()}
     }
 
 # =============================
@@ -854,11 +3447,11 @@ async def websocket_endpoint(websocket: WebSocket):
                 elif data == "get_activities":
                     # Send recent activities on request
                     activities = await get_recent_activities(20)
-                    await websocket.send_json({
+                    await websocket.send_text(encode_json({
                         "type": "activities",
                         "data": activities,
                         "timestamp": datetime.now().isoformat()
-                    })
+                    }).decode())
             except asyncio.TimeoutError:
                 # Send heartbeat to keep connection alive
                 try:
@@ -887,7 +3480,7 @@ async def signup(request: SignupRequest):
     
     print(f"📝 DEBUG: Signup attempt for: {request.email}")
     
-    if not firebase_initialized:
+    if not storage_ready():
         print(f"❌ DEBUG: Firebase not initialized!")
         raise HTTPException(
             status_code=503, 
@@ -912,8 +3505,7 @@ async def signup(request: SignupRequest):
     
     # Check admin limit
     if request.role == UserRole.ADMIN:
-        users = await get_all_users()
-        admin_count = sum(1 for u in users if u.get("role") == "admin")
+        admin_count = await count_documents(users_repo, [("role", "==", UserRole.ADMIN.value)])
         if admin_count >= MAX_ADMINS:
             raise HTTPException(status_code=403, detail="Admin account limit reached")
     
@@ -975,7 +3567,7 @@ async def login(request: LoginRequest):
     
     print(f"🔐 DEBUG: Login attempt for email: {request.email}")
     
-    if not firebase_initialized:
+    if not storage_ready():
         print(f"❌ DEBUG: Firebase not initialized!")
         raise HTTPException(
             status_code=503,
@@ -1011,8 +3603,10 @@ async def login(request: LoginRequest):
     
     # Update last login
     try:
-        db.collection("users").document(user["id"]).update({
-            "last_login": datetime.now()
+        now = datetime.now()
+        await users_repo.update(user["id"], {
+            "last_login": now,
+            "updated_at": now
         })
     except Exception as e:
         print(f"Note: Could not update last login: {e}")
@@ -1151,7 +3745,7 @@ async def reset_password(request: ResetPasswordRequest):
     
     # Update password in Firestore
     try:
-        db.collection("users").document(user["id"]).update({
+        await users_repo.update(user["id"], {
             "password": request.new_password,
             "updated_at": datetime.now()
         })
@@ -1181,17 +3775,21 @@ async def reset_password(request: ResetPasswordRequest):
 # DASHBOARD ENDPOINTS (NO AUTH REQUIRED)
 # =============================
 
-@app.get("/api/admin/dashboard/stats")
-async def get_dashboard_statistics():
+@app.get("/api/admin/dashboard/stats", dependencies=[conditional_get(*STATS_COLLECTIONS)])
+async def get_dashboard_statistics(request: Request, response: Response):
     """Get real-time dashboard statistics (NO AUTH)"""
-    stats = await get_dashboard_stats()
-    return stats
+    snapshot = await dashboard_snapshot.get()
+    # The snapshot may trail the current versions; tag it with the ones it was built from
+    if "ETag" in response.headers:
+        response.headers["ETag"] = make_etag(request, dashboard_snapshot.stamp)
+    return snapshot["stats"]
 
-@app.get("/api/admin/dashboard/recent-activities")
-async def get_dashboard_activities(limit: int = 20):
+@app.get("/api/admin/dashboard/recent-activities", dependencies=[conditional_get("activities")])
+async def get_dashboard_activities(response: Response, limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+                                   type: Optional[ActivityType] = None):
     """Get recent activities (NO AUTH)"""
-    activities = await get_recent_activities(limit)
-    return {"activities": activities}
+    activities = await get_recent_activities(limit, type.value if type else None)
+    return json_response({"activities": activities}, response)
 
 # =============================
 # HOSPITAL MANAGEMENT (FLEXIBLE DATA - NO AUTH)
@@ -1201,43 +3799,19 @@ async def get_dashboard_activities(limit: int = 20):
 async def add_hospital(hospital: FlexibleHospitalRequest):
     """Add new hospital (NO AUTH) - FLEXIBLE VERSION"""
     
-    if not firebase_initialized or not db:
+    if not storage_ready():
         raise HTTPException(status_code=503, detail="Firebase not initialized")
     
     hospital_id = str(uuid.uuid4())
-    
-    # Get phone from either contact or phone field
-    phone = hospital.phone or hospital.contact or ""
-    
-    # Convert services if needed
-    services = []
-    if hospital.services:
-        if isinstance(hospital.services, str):
-            services = [s.strip() for s in hospital.services.split(',') if s.strip()]
-        elif isinstance(hospital.services, list):
-            services = hospital.services
-    
-    hospital_data = {
-        "id": hospital_id,
-        "name": hospital.name,
-        "address": hospital.address or "",
-        "contact": phone,
-        "phone": phone,
-        "email": hospital.email or "",
-        "services": services,
-        "doctors": hospital.doctors or 0,
-        "status": hospital.status or "Active",
-        "operating_hours": hospital.operating_hours or hospital.hours or "",
-        "created_at": datetime.now(),
-        "created_by": "system"
-    }
+    hospital_data = build_hospital_document(hospital_id, hospital)
+    phone = hospital_data["phone"]
     
     try:
-        # Clean up None values
-        hospital_data = {k: v for k, v in hospital_data.items() if v is not None}
-        
         # SAVE TO FIRESTORE
-        db.collection("hospitals").document(hospital_id).set(hospital_data)
+        batch = WriteBatch()
+        batch.set("hospitals", hospital_id, hospital_data)
+        stage_counter_updates(batch, "hospitals", None, hospital_data)
+        await batch.commit()
         print(f"✅ Hospital saved to Firestore: {hospital.name}")
         
         # Log activity with proper details
@@ -1264,28 +3838,51 @@ async def add_hospital(hospital: FlexibleHospitalRequest):
         print(f"❌ Error adding hospital: {e}")
         raise HTTPException(status_code=500, detail=f"Error adding hospital: {str(e)}")
 
-@app.get("/api/admin/hospitals")
-async def get_hospitals():
-    """Get all hospitals (NO AUTH)"""
-    hospitals = await get_all_hospitals()
-    return {"hospitals": hospitals, "total": len(hospitals), "success": True}
+@app.get("/api/admin/hospitals", response_model=HospitalPage, dependencies=[conditional_get("hospitals")])
+async def get_hospitals(
+    response: Response,
+    page_size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    status: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    sort: Optional[str] = None
+):
+    """Get hospitals one page at a time; filter by status/created_after, sort=-created_at|name (NO AUTH)"""
+    if not storage_ready():
+        return {"hospitals": [], "total": 0, "count": 0, "next_cursor": None, "success": True}
+    
+    try:
+        filters, sort_field, descending = list_query("hospitals", equality_filters(status=status), created_after, sort)
+        projection = resolve_fields("hospitals", fields, sort_field)
+        hospitals, next_cursor = await fetch_page(hospitals_repo, sort_field, page_size, cursor, filters,
+                                                  descending, projection)
+        return json_response(
+            {"hospitals": hospitals, "total": await collection_total(hospitals_repo, filters), "count": len(hospitals),
+             "next_cursor": next_cursor, "success": True}, response
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching hospitals: {str(e)}")
 
 @app.delete("/api/admin/hospitals/{hospital_id}")
 async def delete_hospital(hospital_id: str):
     """Delete hospital (NO AUTH)"""
     
-    if not firebase_initialized or not db:
+    if not storage_ready():
         raise HTTPException(status_code=503, detail="Firebase not initialized")
     
     try:
-        # Get hospital name before deleting
-        hospital_doc = db.collection("hospitals").document(hospital_id).get()
-        hospital_name = "Unknown"
-        if hospital_doc.exists:
-            hospital_name = hospital_doc.to_dict().get("name", "Unknown")
+        # Delete hospital; the counters move by what the transaction read
+        def plan(batch, hospital_doc):
+            stage_delete(batch, "hospitals", hospital_id, hospital_doc)
+            stage_counter_updates(batch, "hospitals", hospital_doc, None)
         
-        # Delete hospital
-        db.collection("hospitals").document(hospital_id).delete()
+        hospital_doc, = await run_transaction([("hospitals", hospital_id)], plan)
+        hospital_name = "Unknown"
+        if hospital_doc:
+            hospital_name = hospital_doc.get("name", "Unknown")
         print(f"✅ Hospital deleted: {hospital_name}")
         
         # Log activity
@@ -1312,35 +3909,19 @@ async def delete_hospital(hospital_id: str):
 async def add_slaughterhouse(slaughterhouse: FlexibleSlaughterhouseRequest):
     """Add new slaughterhouse (NO AUTH) - FLEXIBLE VERSION"""
     
-    if not firebase_initialized or not db:
+    if not storage_ready():
         raise HTTPException(status_code=503, detail="Firebase not initialized")
     
     slaughterhouse_id = str(uuid.uuid4())
-    
-    # Get phone from either contact or phone field
-    phone = slaughterhouse.phone or slaughterhouse.contact or ""
-    
-    slaughterhouse_data = {
-        "id": slaughterhouse_id,
-        "name": slaughterhouse.name,
-        "address": slaughterhouse.address or "",
-        "contact": phone,
-        "phone": phone,
-        "email": slaughterhouse.email or "",
-        "capacity": slaughterhouse.capacity or "",
-        "status": slaughterhouse.status or "Active",
-        "operating_hours": slaughterhouse.operating_hours or slaughterhouse.hours or "",
-        "certification": slaughterhouse.certification or "",
-        "created_at": datetime.now(),
-        "created_by": "system"
-    }
+    slaughterhouse_data = build_slaughterhouse_document(slaughterhouse_id, slaughterhouse)
+    phone = slaughterhouse_data["phone"]
     
     try:
-        # Clean up None values
-        slaughterhouse_data = {k: v for k, v in slaughterhouse_data.items() if v is not None}
-        
         # SAVE TO FIRESTORE
-        db.collection("slaughterhouses").document(slaughterhouse_id).set(slaughterhouse_data)
+        batch = WriteBatch()
+        batch.set("slaughterhouses", slaughterhouse_id, slaughterhouse_data)
+        stage_counter_updates(batch, "slaughterhouses", None, slaughterhouse_data)
+        await batch.commit()
         print(f"✅ Slaughterhouse saved to Firestore: {slaughterhouse.name}")
         
         # Log activity with proper details
@@ -1368,28 +3949,56 @@ async def add_slaughterhouse(slaughterhouse: FlexibleSlaughterhouseRequest):
         print(f"❌ Error adding slaughterhouse: {e}")
         raise HTTPException(status_code=500, detail=f"Error adding slaughterhouse: {str(e)}")
 
-@app.get("/api/admin/slaughterhouses")
-async def get_slaughterhouses_endpoint():
-    """Get all slaughterhouses (NO AUTH)"""
-    slaughterhouses = await get_all_slaughterhouses()
-    return {"slaughterhouses": slaughterhouses, "total": len(slaughterhouses), "success": True}
+@app.get("/api/admin/slaughterhouses", response_model=SlaughterhousePage, dependencies=[conditional_get("slaughterhouses")])
+async def get_slaughterhouses_endpoint(
+    response: Response,
+    page_size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    status: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    sort: Optional[str] = None
+):
+    """Get slaughterhouses one page at a time; filter by status/created_after, sort=-created_at|name (NO AUTH)"""
+    if not storage_ready():
+        return {"slaughterhouses": [], "total": 0, "count": 0, "next_cursor": None, "success": True}
+    
+    try:
+        filters, sort_field, descending = list_query(
+            "slaughterhouses", equality_filters(status=status), created_after, sort
+        )
+        projection = resolve_fields("slaughterhouses", fields, sort_field)
+        slaughterhouses, next_cursor = await fetch_page(slaughterhouses_repo, sort_field, page_size, cursor,
+                                                        filters, descending, projection)
+        return json_response({
+            "slaughterhouses": slaughterhouses,
+            "total": await collection_total(slaughterhouses_repo, filters),
+            "count": len(slaughterhouses),
+            "next_cursor": next_cursor,
+            "success": True
+        }, response)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching slaughterhouses: {str(e)}")
 
 @app.delete("/api/admin/slaughterhouses/{slaughterhouse_id}")
 async def delete_slaughterhouse(slaughterhouse_id: str):
     """Delete slaughterhouse (NO AUTH)"""
     
-    if not firebase_initialized or not db:
+    if not storage_ready():
         raise HTTPException(status_code=503, detail="Firebase not initialized")
     
     try:
-        # Get slaughterhouse name before deleting
-        slaughterhouse_doc = db.collection("slaughterhouses").document(slaughterhouse_id).get()
-        slaughterhouse_name = "Unknown"
-        if slaughterhouse_doc.exists:
-            slaughterhouse_name = slaughterhouse_doc.to_dict().get("name", "Unknown")
+        # Delete slaughterhouse; the counters move by what the transaction read
+        def plan(batch, slaughterhouse_doc):
+            stage_delete(batch, "slaughterhouses", slaughterhouse_id, slaughterhouse_doc)
+            stage_counter_updates(batch, "slaughterhouses", slaughterhouse_doc, None)
         
-        # Delete slaughterhouse
-        db.collection("slaughterhouses").document(slaughterhouse_id).delete()
+        slaughterhouse_doc, = await run_transaction([("slaughterhouses", slaughterhouse_id)], plan)
+        slaughterhouse_name = "Unknown"
+        if slaughterhouse_doc:
+            slaughterhouse_name = slaughterhouse_doc.get("name", "Unknown")
         print(f"✅ Slaughterhouse deleted: {slaughterhouse_name}")
         
         # Log activity
@@ -1412,29 +4021,89 @@ async def delete_slaughterhouse(slaughterhouse_id: str):
 # USER MANAGEMENT (NO AUTH REQUIRED)
 # =============================
 
-@app.get("/api/admin/users")
-async def get_all_users_endpoint():
-    """Get all users (NO AUTH)"""
-    users = await get_all_users()
-    return {"users": users, "total": len(users), "success": True}
+@app.get("/api/admin/users", response_model=UserPage, dependencies=[conditional_get("users")])
+async def get_all_users_endpoint(
+    response: Response,
+    page_size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    role: Optional[str] = None,
+    status: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    sort: Optional[str] = None
+):
+    """Get users one page at a time; filter by role/status/created_after; passwords are never returned (NO AUTH)"""
+    if not storage_ready():
+        return {"users": [], "total": 0, "count": 0, "next_cursor": None, "success": True}
+    
+    try:
+        filters, sort_field, descending = list_query("users", equality_filters(role=role, status=status),
+                                                     created_after, sort)
+        projection = resolve_fields("users", fields, sort_field)
+        users, next_cursor = await fetch_page(users_repo, sort_field, page_size, cursor, filters,
+                                              descending, projection)
+        return json_response(
+            {"users": users, "total": await collection_total(users_repo, filters), "count": len(users),
+             "next_cursor": next_cursor, "success": True}, response
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching users: {str(e)}")
+
+
+@app.get("/api/admin/users/count", dependencies=[conditional_get("users")])
+async def get_users_count(role: Optional[str] = None, status: Optional[str] = None):
+    """Get user count, optionally by role/status (NO AUTH)"""
+    filters = equality_filters(role=role, status=status)
+    one_month_ago = datetime.now() - timedelta(days=30)
+    total_users, last_month_users = await asyncio.gather(
+        count_documents(users_repo, filters),
+        count_documents(users_repo, filters + [("created_at", ">=", one_month_ago)])
+    )
+    return {"total_users": total_users, "last_month_users": last_month_users}
+
+@app.get("/api/admin/hospitals/count", dependencies=[conditional_get("hospitals")])
+async def get_hospitals_count(status: Optional[str] = None):
+    """Get hospitals count, optionally by status (NO AUTH)"""
+    total = await count_documents(hospitals_repo, equality_filters(status=status))
+    return {"total_hospitals": total}
 
-@app.get("/api/admin/users/count")
-async def get_users_count():
-    """Get user count (NO AUTH)"""
-    users = await get_all_users()
-    return {"total_users": len(users), "last_month_users": 0}
+@app.get("/api/admin/slaughterhouses/count", dependencies=[conditional_get("slaughterhouses")])
+async def get_slaughterhouses_count(status: Optional[str] = None):
+    """Get slaughterhouses count, optionally by status (NO AUTH)"""
+    total = await count_documents(slaughterhouses_repo, equality_filters(status=status))
+    return {"total_slaughterhouses": total}
 
-@app.get("/api/admin/hospitals/count")
-async def get_hospitals_count():
-    """Get hospitals count (NO AUTH)"""
-    hospitals = await get_all_hospitals()
-    return {"total_hospitals": len(hospitals)}
+@app.get("/api/admin/feedback/count", dependencies=[conditional_get("feedbacks")])
+async def get_feedback_count(status: Optional[str] = None, target_type: Optional[str] = None):
+    """Get feedback count, e.g. ?status=new for pending feedback (NO AUTH)"""
+    filters = equality_filters(status=status, target_type=target_type)
+    total, pending = await asyncio.gather(
+        count_documents(feedbacks_repo, filters),
+        count_documents(feedbacks_repo, equality_filters(status=FeedbackStatus.NEW.value, target_type=target_type))
+    )
+    return {"total_feedbacks": total, "pending_feedbacks": pending}
 
-@app.get("/api/admin/slaughterhouses/count")
-async def get_slaughterhouses_count():
-    """Get slaughterhouses count (NO AUTH)"""
-    slaughterhouses = await get_all_slaughterhouses()
-    return {"total_slaughterhouses": len(slaughterhouses)}
+@app.get("/api/admin/facets", dependencies=[conditional_get("hospitals", "slaughterhouses", "users")])
+async def get_facets(collection: Optional[str] = None):
+    """Facet counts for filter sidebars, e.g. ?collection=hospitals (NO AUTH)"""
+    if collection and collection not in FACET_FIELDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"No facets for '{collection}'. Available: {', '.join(FACET_FIELDS)}"
+        )
+    if not storage_ready():
+        return {"facets": {}, "success": True}
+    
+    try:
+        facets = await facet_counters.read()
+        if collection:
+            facets = {collection: facets.get(collection, {})}
+        return {"facets": facets, "success": True}
+    except Exception as e:
+        print(f"❌ Error fetching facets: {e}")
+        raise HTTPException(status_code=500, detail=f"Error fetching facets: {str(e)}")
 
 # =============================
 # FEEDBACK MANAGEMENT
@@ -1444,10 +4113,11 @@ async def get_slaughterhouses_count():
 async def submit_feedback(feedback: FeedbackRequest):
     """Submit feedback (NO AUTH)"""
     
-    if not firebase_initialized or not db:
+    if not storage_ready():
         raise HTTPException(status_code=503, detail="Firebase not initialized")
     
     feedback_id = str(uuid.uuid4())
+    now = datetime.now()
     feedback_data = {
         "id": feedback_id,
         "user_id": feedback.user_id,
@@ -1457,57 +4127,111 @@ async def submit_feedback(feedback: FeedbackRequest):
         "target_name": feedback.target_name,
         "rating": feedback.rating,
         "comment": feedback.comment,
-        "created_at": datetime.now(),
+        "created_at": now,
+        "updated_at": now,
         "status": "new"
     }
     
     try:
-        db.collection("feedbacks").document(feedback_id).set(feedback_data)
+        batch = WriteBatch()
+        batch.set("feedbacks", feedback_id, feedback_data)
+        stage_counter_updates(batch, "feedbacks", None, feedback_data)
+        await batch.commit()
+        
+        # Log activity
+        await log_activity(
+            ActivityType.FEEDBACK_SUBMITTED,
+            feedback.user_id,
+            feedback.user_name,
+            {
+                "target_type": feedback.target_type,
+                "target_name": feedback.target_name,
+                "rating": feedback.rating,
+                "feedback_id": feedback_id
+            }
+        )
+        
+        return {
+            "message": "Feedback submitted successfully",
+            "feedback": feedback_data,
+            "success": True
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error submitting feedback: {str(e)}")
+
+@app.get("/api/admin/feedback", response_model=FeedbackPage, dependencies=[conditional_get("feedbacks")])
+async def get_all_feedback(
+    response: Response,
+    page_size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    status: Optional[str] = None,
+    target_type: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    sort: Optional[str] = None
+):
+    """Get feedback one page at a time; filter by status/target_type/created_after, sort=-created_at|rating (NO AUTH)"""
+    
+    if not storage_ready():
+        return {"feedbacks": [], "total": 0, "count": 0, "next_cursor": None, "success": True}
+    
+    try:
+        filters, sort_field, descending = list_query(
+            "feedbacks", equality_filters(status=status, target_type=target_type), created_after, sort
+        )
+        projection = resolve_fields("feedbacks", fields, sort_field)
+        feedbacks, next_cursor = await fetch_page(feedbacks_repo, sort_field, page_size, cursor, filters,
+                                                  descending, projection)
+        return json_response(
+            {"feedbacks": feedbacks, "total": await collection_total(feedbacks_repo, filters), "count": len(feedbacks),
+             "next_cursor": next_cursor, "success": True}, response
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching feedback: {str(e)}")
+
+@app.put("/api/admin/feedback/{feedback_id}/status")
+async def update_feedback_status(feedback_id: str, request: FeedbackStatusRequest):
+    """Change feedback status, e.g. new -> reviewed (NO AUTH)"""
+    
+    if not storage_ready():
+        raise HTTPException(status_code=503, detail="Firebase not initialized")
+    
+    try:
+        feedback_update = {
+            "status": request.status.value,
+            "updated_at": datetime.now()
+        }
+        
+        # Update feedback and move the pending counters in the same transaction
+        def plan(batch, existing_data):
+            if not existing_data:
+                raise HTTPException(status_code=404, detail="Feedback not found")
+            batch.update("feedbacks", feedback_id, feedback_update)
+            stage_counter_updates(batch, "feedbacks", existing_data, {**existing_data, **feedback_update})
+        
+        existing_data, = await run_transaction([("feedbacks", feedback_id)], plan)
         
         # Log activity
         await log_activity(
-            ActivityType.FEEDBACK_SUBMITTED,
-            feedback.user_id,
-            feedback.user_name,
+            ActivityType.FEEDBACK_UPDATED,
+            "system",
+            "system",
             {
-                "target_type": feedback.target_type,
-                "target_name": feedback.target_name,
-                "rating": feedback.rating,
-                "feedback_id": feedback_id
+                "feedback_id": feedback_id,
+                "target_name": existing_data.get("target_name", "Unknown"),
+                "status": request.status.value,
+                "updated_by": "system"
             }
         )
         
-        return {
-            "message": "Feedback submitted successfully",
-            "feedback": feedback_data,
-            "success": True
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error submitting feedback: {str(e)}")
-
-@app.get("/api/admin/feedback")
-async def get_all_feedback():
-    """Get all feedback (NO AUTH)"""
-    
-    if not firebase_initialized or not db:
-        return {"feedbacks": [], "total": 0, "success": True}
-    
-    try:
-        feedbacks_ref = db.collection("feedbacks").order_by("created_at", direction=firestore.Query.DESCENDING)
-        docs = feedbacks_ref.stream()
+        return {"message": "Feedback status updated successfully", "success": True}
         
-        feedbacks = []
-        for doc in docs:
-            feedback_data = doc.to_dict()
-            feedback_data["id"] = doc.id
-            if "created_at" in feedback_data and feedback_data["created_at"]:
-                if isinstance(feedback_data["created_at"], datetime):
-                    feedback_data["created_at"] = feedback_data["created_at"].isoformat()
-            feedbacks.append(feedback_data)
-        
-        return {"feedbacks": feedbacks, "total": len(feedbacks), "success": True}
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching feedback: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error updating feedback: {str(e)}")
 
 # =============================
 # UPDATE HOSPITAL ENDPOINT (FLEXIBLE DATA - NO AUTH)
@@ -1520,40 +4244,22 @@ async def update_hospital(
 ):
     """Update hospital (NO AUTH) - FLEXIBLE VERSION"""
     
-    if not firebase_initialized or not db:
+    if not storage_ready():
         raise HTTPException(status_code=503, detail="Firebase not initialized")
     
     try:
-        # Get existing hospital
-        hospital_ref = db.collection("hospitals").document(hospital_id)
-        hospital_doc = hospital_ref.get()
+        hospital_update = prepare_facility_update(hospital_update)
         
-        if not hospital_doc.exists:
-            raise HTTPException(status_code=404, detail="Hospital not found")
+        # Update hospital and its facet counters from the state the transaction read
+        def plan(batch, existing_data):
+            if not existing_data:
+                raise HTTPException(status_code=404, detail="Hospital not found")
+            batch.update("hospitals", hospital_id, hospital_update)
+            stage_counter_updates(batch, "hospitals", existing_data, {**existing_data, **hospital_update})
         
-        existing_data = hospital_doc.to_dict()
+        existing_data, = await run_transaction([("hospitals", hospital_id)], plan)
         hospital_name = existing_data.get("name", "Unknown")
         
-        # Handle services field conversion if it's a string
-        if 'services' in hospital_update and isinstance(hospital_update['services'], str):
-            hospital_update['services'] = [s.strip() for s in hospital_update['services'].split(',') if s.strip()]
-        
-        # Handle contact/phone fields
-        if 'phone' in hospital_update and 'contact' not in hospital_update:
-            hospital_update['contact'] = hospital_update['phone']
-        elif 'contact' in hospital_update and 'phone' not in hospital_update:
-            hospital_update['phone'] = hospital_update['contact']
-        
-        # Add update metadata
-        hospital_update["updated_at"] = datetime.now()
-        hospital_update["updated_by"] = "system"
-        
-        # Update hospital
-        hospital_ref.update(hospital_update)
-        
-        # Get updated data for activity log
-        updated_data = {**existing_data, **hospital_update}
-        
         # Log activity
         await log_activity(
             ActivityType.HOSPITAL_UPDATED,
@@ -1586,33 +4292,23 @@ async def update_slaughterhouse(
 ):
     """Update slaughterhouse (NO AUTH) - FLEXIBLE VERSION"""
     
-    if not firebase_initialized or not db:
+    if not storage_ready():
         raise HTTPException(status_code=503, detail="Firebase not initialized")
     
     try:
-        # Get existing slaughterhouse
-        slaughterhouse_ref = db.collection("slaughterhouses").document(slaughterhouse_id)
-        slaughterhouse_doc = slaughterhouse_ref.get()
+        slaughterhouse_update = prepare_facility_update(slaughterhouse_update)
         
-        if not slaughterhouse_doc.exists:
-            raise HTTPException(status_code=404, detail="Slaughterhouse not found")
+        # Update slaughterhouse and its facet counters from the state the transaction read
+        def plan(batch, existing_data):
+            if not existing_data:
+                raise HTTPException(status_code=404, detail="Slaughterhouse not found")
+            batch.update("slaughterhouses", slaughterhouse_id, slaughterhouse_update)
+            stage_counter_updates(batch, "slaughterhouses", existing_data,
+                                  {**existing_data, **slaughterhouse_update})
         
-        existing_data = slaughterhouse_doc.to_dict()
+        existing_data, = await run_transaction([("slaughterhouses", slaughterhouse_id)], plan)
         slaughterhouse_name = existing_data.get("name", "Unknown")
         
-        # Handle contact/phone fields
-        if 'phone' in slaughterhouse_update and 'contact' not in slaughterhouse_update:
-            slaughterhouse_update['contact'] = slaughterhouse_update['phone']
-        elif 'contact' in slaughterhouse_update and 'phone' not in slaughterhouse_update:
-            slaughterhouse_update['phone'] = slaughterhouse_update['contact']
-        
-        # Add update metadata
-        slaughterhouse_update["updated_at"] = datetime.now()
-        slaughterhouse_update["updated_by"] = "system"
-        
-        # Update slaughterhouse
-        slaughterhouse_ref.update(slaughterhouse_update)
-        
         # Log activity
         await log_activity(
             ActivityType.SLAUGHTERHOUSE_UPDATED,
@@ -1642,22 +4338,21 @@ async def update_slaughterhouse(
 async def delete_user(user_id: str):
     """Delete user (NO AUTH)"""
     
-    if not firebase_initialized or not db:
+    if not storage_ready():
         raise HTTPException(status_code=503, detail="Firebase not initialized")
     
     try:
-        # Get user data before deleting
-        user_doc = db.collection("users").document(user_id).get()
-        if not user_doc.exists:
-            raise HTTPException(status_code=404, detail="User not found")
+        # Delete user; a concurrent delete sees it gone and moves no counters
+        def plan(batch, user_data):
+            if not user_data:
+                raise HTTPException(status_code=404, detail="User not found")
+            stage_delete(batch, "users", user_id, user_data)
+            stage_counter_updates(batch, "users", user_data, None)
         
-        user_data = user_doc.to_dict()
+        user_data, = await run_transaction([("users", user_id)], plan)
         user_name = user_data.get("full_name", "Unknown")
         user_email = user_data.get("email", "Unknown")
         user_role = user_data.get("role", "Unknown")
-        
-        # Delete user
-        db.collection("users").document(user_id).delete()
         print(f"✅ User deleted: {user_name} ({user_email})")
         
         # Log activity
@@ -1684,26 +4379,23 @@ async def delete_user(user_id: str):
 async def update_user(user_id: str, user_update: dict = Body(...)):
     """Update user (NO AUTH)"""
     
-    if not firebase_initialized or not db:
+    if not storage_ready():
         raise HTTPException(status_code=503, detail="Firebase not initialized")
     
     try:
-        # Get existing user
-        user_ref = db.collection("users").document(user_id)
-        user_doc = user_ref.get()
-        
-        if not user_doc.exists:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        existing_data = user_doc.to_dict()
-        user_name = existing_data.get("full_name", "Unknown")
-        
         # Add update metadata
         user_update["updated_at"] = datetime.now()
         user_update["updated_by"] = "system"
         
-        # Update user
-        user_ref.update(user_update)
+        # Update user (role changes move the dashboard counters, read in the same transaction)
+        def plan(batch, existing_data):
+            if not existing_data:
+                raise HTTPException(status_code=404, detail="User not found")
+            batch.update("users", user_id, user_update)
+            stage_counter_updates(batch, "users", existing_data, {**existing_data, **user_update})
+        
+        existing_data, = await run_transaction([("users", user_id)], plan)
+        user_name = existing_data.get("full_name", "Unknown")
         
         # Log activity
         await log_activity(
@@ -1733,18 +4425,16 @@ async def update_user(user_id: str, user_update: dict = Body(...)):
 async def save_user_settings(request: UserSettingsRequest):
     """Save user theme settings"""
     
-    if not firebase_initialized:
+    if not storage_ready():
         raise HTTPException(status_code=503, detail="Firebase not initialized")
     
     try:
         # Verify user exists
-        user_ref = db.collection("users").document(request.user_id)
-        user_doc = user_ref.get()
+        user_data = await users_repo.get(request.user_id)
         
-        if not user_doc.exists:
+        if not user_data:
             raise HTTPException(status_code=404, detail="User not found")
         
-        user_data = user_doc.to_dict()
         
         # Convert settings to dict
         settings_dict = request.settings.dict()
@@ -1781,15 +4471,14 @@ async def save_user_settings(request: UserSettingsRequest):
 async def get_user_settings_endpoint(user_id: str):
     """Get user theme settings"""
     
-    if not firebase_initialized:
+    if not storage_ready():
         raise HTTPException(status_code=503, detail="Firebase not initialized")
     
     try:
         # Verify user exists
-        user_ref = db.collection("users").document(user_id)
-        user_doc = user_ref.get()
+        user_data = await users_repo.get(user_id)
         
-        if not user_doc.exists:
+        if not user_data:
             raise HTTPException(status_code=404, detail="User not found")
         
         # Get user settings
@@ -1822,18 +4511,16 @@ async def get_user_settings_endpoint(user_id: str):
 async def toggle_two_factor_auth(request: TwoFactorAuthRequest):
     """Enable/Disable two-factor authentication"""
     
-    if not firebase_initialized:
+    if not storage_ready():
         raise HTTPException(status_code=503, detail="Firebase not initialized")
     
     try:
         # Verify user exists
-        user_ref = db.collection("users").document(request.user_id)
-        user_doc = user_ref.get()
+        user_data = await users_repo.get(request.user_id)
         
-        if not user_doc.exists:
+        if not user_data:
             raise HTTPException(status_code=404, detail="User not found")
         
-        user_data = user_doc.to_dict()
         
         # Get current settings
         settings = await get_user_settings(request.user_id)
@@ -1904,18 +4591,16 @@ async def toggle_two_factor_auth(request: TwoFactorAuthRequest):
 async def verify_two_factor_auth(request: TwoFactorAuthRequest):
     """Verify two-factor authentication code"""
     
-    if not firebase_initialized:
+    if not storage_ready():
         raise HTTPException(status_code=503, detail="Firebase not initialized")
     
     try:
         # Verify user exists
-        user_ref = db.collection("users").document(request.user_id)
-        user_doc = user_ref.get()
+        user_data = await users_repo.get(request.user_id)
         
-        if not user_doc.exists:
+        if not user_data:
             raise HTTPException(status_code=404, detail="User not found")
         
-        user_data = user_doc.to_dict()
         
         # Get settings
         settings = await get_user_settings(request.user_id)
@@ -1942,6 +4627,736 @@ async def verify_two_factor_auth(request: TwoFactorAuthRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error verifying 2FA: {str(e)}")
 
+# =============================
+# DATA EXPORT ENDPOINTS
+# =============================
+
+# Exportable collections and the date field the range filters apply to
+EXPORT_COLLECTIONS = {
+    "users": "created_at",
+    "hospitals": "created_at",
+    "slaughterhouses": "created_at",
+    "feedbacks": "created_at",
+    "activities": "timestamp",
+}
+EXPORT_BATCH_SIZE = 500
+
+def _csv_value(value) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list) and all(not isinstance(item, (dict, list)) for item in value):
+        return "; ".join(str(item) for item in value)
+    if isinstance(value, (dict, list)):
+        return encode_json(value).decode()
+    return value
+
+def _csv_chunk(rows: List[List[Any]]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
+
+@app.get("/api/admin/export/{collection}")
+async def export_collection(
+    collection: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    fields: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None
+):
+    """Stream a whole collection as NDJSON or CSV in constant memory (NO AUTH).
+
+    created_after/created_before filter on created_at (timestamp for activities).
+    """
+    if collection not in EXPORT_COLLECTIONS:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Cannot export '{collection}'. Available: {', '.join(EXPORT_COLLECTIONS)}"
+        )
+    if not storage_ready():
+        raise HTTPException(status_code=503, detail="Firebase not initialized")
+    
+    date_field = EXPORT_COLLECTIONS[collection]
+    filters = []
+    if created_after:
+        filters.append((date_field, ">", created_after))
+    if created_before:
+        filters.append((date_field, "<", created_before))
+    # Document-id order reaches every document; a date range has to order on the date field
+    order_by = date_field if filters else "id"
+    projection = resolve_fields(collection, fields, date_field)
+    columns = ["id"] + [field for field in projection if field != "id"]
+    
+    batches = Repository(collection).stream_batches(filters, order_by, fields=projection,
+                                                    batch_size=EXPORT_BATCH_SIZE)
+    try:
+        # Pull the first batch up front so query errors still get a proper status code
+        first_batch = await batches.__anext__()
+    except StopAsyncIteration:
+        first_batch = []
+    except Exception as e:
+        await batches.aclose()
+        raise HTTPException(status_code=500, detail=f"Error exporting {collection}: {str(e)}")
+    
+    def encode(batch: List[Dict[str, Any]]) -> bytes:
+        if format == "csv":
+            return _csv_chunk([[_csv_value(doc.get(column)) for column in columns] for doc in batch])
+        return b"".join(encode_json(doc) + b"\n" for doc in batch)
+    
+    async def body():
+        exported = 0
+        try:
+            if format == "csv":
+                yield _csv_chunk([columns])
+            if first_batch:
+                exported += len(first_batch)
+                yield encode(first_batch)
+            async for batch in batches:
+                exported += len(batch)
+                yield encode(batch)
+            print(f"✅ Exported {exported} {collection} as {format}")
+        except Exception as e:
+            # Headers are already sent; the truncated body is all we can signal
+            print(f"❌ Export of {collection} failed after {exported} rows: {e}")
+        finally:
+            await batches.aclose()
+    
+    filename = f"{collection}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{format}"
+    return StreamingResponse(
+        body(),
+        media_type="text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# =============================
+# BULK IMPORT ENDPOINTS
+# =============================
+
+IMPORT_COLLECTIONS = {
+    "hospitals": (FlexibleHospitalRequest, build_hospital_document),
+    "slaughterhouses": (FlexibleSlaughterhouseRequest, build_slaughterhouse_document),
+}
+FIRESTORE_BATCH_LIMIT = 500
+# Each chunk's batch also carries one dashboard and one facet counter increment
+IMPORT_CHUNK_SIZE = FIRESTORE_BATCH_LIMIT - 2
+IMPORT_PARALLEL_BATCHES = int(os.getenv("IMPORT_PARALLEL_BATCHES", "4"))
+IMPORT_MAX_REPORTED_ERRORS = 1000
+
+def _import_format(content_type: str) -> Optional[str]:
+    content_type = content_type.lower()
+    if "csv" in content_type:
+        return "csv"
+    if "ndjson" in content_type or "jsonl" in content_type:
+        return "ndjson"
+    return None
+
+async def _upload_lines(request: Request) -> AsyncIterator[str]:
+    """Decode the request body incrementally into lines"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()  # drops the BOM spreadsheet exports add
+    pending = ""
+    async for chunk in request.stream():
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending.strip():
+        yield pending.rstrip("\r")
+
+async def _upload_rows(request: Request, format: str) -> AsyncIterator[tuple]:
+    """Yield (row_number, dict) per record, or (row_number, error message) for unparseable ones"""
+    row_number = 0
+    if format == "ndjson":
+        async for line in _upload_lines(request):
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield row_number, f"Invalid JSON: {e}"
+                continue
+            yield row_number, row if isinstance(row, dict) else "Each line must be a JSON object"
+        return
+    
+    header = None
+    record: List[str] = []
+    async for line in _upload_lines(request):
+        record.append(line)
+        text = "\n".join(record)
+        if text.count('"') % 2:
+            continue  # inside a quoted field that spans lines
+        record = []
+        values = next(csv.reader(io.StringIO(text)), [])
+        if not any(value.strip() for value in values):
+            continue
+        if header is None:
+            header = [value.strip() for value in values]
+            continue
+        row_number += 1
+        if len(values) > len(header):
+            yield row_number, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        # Empty CSV cells mean "not provided", not an empty string
+        yield row_number, {key: value for key, value in zip(header, values) if key and value != ""}
+
+@app.post("/api/admin/import/{collection}")
+async def import_facilities(
+    collection: str,
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    dry_run: bool = False
+):
+    """Bulk-create hospitals or slaughterhouses from a streamed CSV or NDJSON body (NO AUTH).
+
+    Rows are validated with the same rules as the single-create endpoints and
+    written in batches of up to 500 operations, with a bounded number of
+    batches in flight. One summary activity is logged instead of one per row.
+    """
+    if collection not in IMPORT_COLLECTIONS:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Cannot import into '{collection}'. Available: {', '.join(IMPORT_COLLECTIONS)}"
+        )
+    if not storage_ready():
+        raise HTTPException(status_code=503, detail="Firebase not initialized")
+    format = format or _import_format(request.headers.get("content-type", ""))
+    if format is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Send Content-Type text/csv or application/x-ndjson, or pass ?format=csv|ndjson"
+        )
+    
+    model, build_document = IMPORT_COLLECTIONS[collection]
+    slots = asyncio.Semaphore(IMPORT_PARALLEL_BATCHES)
+    in_flight = set()
+    chunk: List[tuple] = []
+    errors: List[Dict[str, Any]] = []
+    summary = {"rows": 0, "valid": 0, "imported": 0, "failed": 0}
+    aborted = None
+    
+    def report(row_number: int, messages: List[str]):
+        summary["failed"] += 1
+        if len(errors) < IMPORT_MAX_REPORTED_ERRORS:
+            errors.append({"row": row_number, "errors": messages})
+    
+    async def commit_chunk(rows: List[tuple]):
+        try:
+            batch = WriteBatch()
+            for _, doc in rows:
+                batch.set(collection, doc["id"], doc)
+            stage_bulk_counter_updates(batch, [(collection, None, doc) for _, doc in rows])
+            await batch.commit()
+            summary["imported"] += len(rows)
+        except Exception as e:
+            for row_number, _ in rows:
+                report(row_number, [f"Write failed: {e}"])
+        finally:
+            slots.release()
+    
+    async def flush():
+        nonlocal chunk
+        rows, chunk = chunk, []
+        # Waiting for a free slot stops reading the upload: backpressure on the client
+        await slots.acquire()
+        task = asyncio.create_task(commit_chunk(rows))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    
+    try:
+        async for row_number, row in _upload_rows(request, format):
+            summary["rows"] += 1
+            if isinstance(row, str):
+                report(row_number, [row])
+                continue
+            try:
+                doc = build_document(str(uuid.uuid4()), model(**row))
+            except ValidationError as e:
+                report(row_number, [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                                    for error in e.errors()])
+                continue
+            except HTTPException as e:
+                report(row_number, [e.detail])
+                continue
+            summary["valid"] += 1
+            if dry_run:
+                continue
+            chunk.append((row_number, doc))
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                await flush()
+        if chunk:
+            await flush()
+    except Exception as e:
+        aborted = f"Upload aborted after {summary['rows']} rows: {e}"
+        print(f"❌ Import into {collection}: {aborted}")
+    finally:
+        await asyncio.gather(*list(in_flight))
+    
+    if summary["imported"]:
+        print(f"✅ Imported {summary['imported']} {collection} ({summary['failed']} failed)")
+        await log_activity(
+            ActivityType.FACILITIES_IMPORTED,
+            "system",
+            "system",
+            {"collection": collection, **summary}
+        )
+    
+    return {
+        "success": not summary["failed"] and aborted is None,
+        "collection": collection,
+        "dry_run": dry_run,
+        **summary,
+        "errors": errors,
+        "errors_truncated": summary["failed"] > len(errors),
+        "aborted": aborted
+    }
+
+# =============================
+# BATCH MUTATION ENDPOINTS
+# =============================
+
+BATCH_COLLECTIONS = {
+    "hospitals": hospitals_repo,
+    "slaughterhouses": slaughterhouses_repo,
+    "users": users_repo,
+}
+# Users are created through signup (password hashing, duplicate email checks)
+BATCH_CREATE_MODELS = {
+    "hospitals": (FlexibleHospitalRequest, build_hospital_document),
+    "slaughterhouses": (FlexibleSlaughterhouseRequest, build_slaughterhouse_document),
+}
+
+def _batch_writes(operation: BatchOperation) -> int:
+    """Batch writes one operation costs; deletes also write a tombstone"""
+    return 2 if operation.op == BatchOpType.DELETE else 1
+
+def _batch_error(status_code: int, detail: str) -> Dict[str, Any]:
+    return {"status": status_code, "error": detail}
+
+def _plan_batch_operation(operation: BatchOperation, existing: Optional[Dict[str, Any]]) -> tuple:
+    """Validate one operation and return (doc_id, before, after, update fields); raises HTTPException"""
+    collection = operation.collection
+    if operation.op == BatchOpType.CREATE:
+        if collection not in BATCH_CREATE_MODELS:
+            raise HTTPException(status_code=400, detail=f"Cannot create {collection} in a batch")
+        model, build_document = BATCH_CREATE_MODELS[collection]
+        try:
+            doc = build_document(operation.id or str(uuid.uuid4()), model(**operation.data))
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail="; ".join(
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+            ))
+        if existing:
+            raise HTTPException(status_code=409, detail=f"{collection} {doc['id']} already exists")
+        return doc["id"], None, doc, None
+    
+    if not operation.id:
+        raise HTTPException(status_code=400, detail=f"{operation.op.value} needs an id")
+    if not existing:
+        raise HTTPException(status_code=404, detail=f"{collection} {operation.id} not found")
+    if operation.op == BatchOpType.DELETE:
+        return operation.id, existing, None, None
+    
+    update = dict(operation.data)
+    if not update:
+        raise HTTPException(status_code=400, detail="update needs data")
+    rejected = sorted(field for field in update if field == "id" or field in SENSITIVE_FIELDS)
+    if rejected:
+        raise HTTPException(status_code=400, detail=f"Cannot update {', '.join(rejected)} in a batch")
+    if collection == "users":
+        update["updated_at"] = datetime.now()
+        update["updated_by"] = "system"
+    else:
+        update = prepare_facility_update(update)
+    return operation.id, existing, {**existing, **update}, update
+
+@app.post("/api/admin/batch")
+async def apply_batch(batch_request: BatchRequest):
+    """Apply many create/update/delete operations in one request (NO AUTH).
+
+    mode=atomic commits everything in a single batch or nothing at all.
+    mode=best_effort skips invalid operations and commits the rest in chunks,
+    so one bad id does not fail its neighbours. Counters are adjusted once per
+    committed chunk and one summary activity is logged.
+    """
+    if not storage_ready():
+        raise HTTPException(status_code=503, detail="Firebase not initialized")
+    
+    operations = batch_request.operations
+    atomic = batch_request.mode == BatchMode.ATOMIC
+    if atomic and sum(_batch_writes(operation) for operation in operations) > IMPORT_CHUNK_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Atomic batches are limited to {IMPORT_CHUNK_SIZE} writes (deletes count twice); "
+                   f"use mode=best_effort"
+        )
+    
+    results = [{"index": index, "op": operation.op.value, "collection": operation.collection, "id": operation.id}
+               for index, operation in enumerate(operations)]
+    
+    # Read every targeted document concurrently before planning any write
+    targets = [(operation.collection, operation.id) if operation.collection in BATCH_COLLECTIONS and operation.id
+               else None for operation in operations]
+    lookups = {target: None for target in targets if target}
+    fetched = await asyncio.gather(*[BATCH_COLLECTIONS[collection].get(doc_id) for collection, doc_id in lookups])
+    lookups = dict(zip(lookups, fetched))
+    
+    planned = []
+    seen = set()
+    for index, operation in enumerate(operations):
+        try:
+            if operation.collection not in BATCH_COLLECTIONS:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Unknown collection '{operation.collection}'. Available: {', '.join(BATCH_COLLECTIONS)}"
+                )
+            doc_id, before, after, update = _plan_batch_operation(operation, lookups.get(targets[index]))
+            if (operation.collection, doc_id) in seen:
+                raise HTTPException(status_code=409, detail=f"{operation.collection} {doc_id} appears twice in this batch")
+            seen.add((operation.collection, doc_id))
+            results[index]["id"] = doc_id
+            planned.append((index, operation, doc_id, before, after, update))
+        except HTTPException as e:
+            results[index].update(_batch_error(e.status_code, e.detail))
+    
+    failures = [result for result in results if "error" in result]
+    if atomic and failures:
+        for result in results:
+            result.setdefault("status", 424)
+            result.setdefault("error", "Not applied: another operation in the atomic batch failed")
+        return FastJSONResponse(status_code=failures[0]["status"], content={
+            "success": False,
+            "mode": batch_request.mode.value,
+            "succeeded": 0,
+            "failed": len(results),
+            "results": results
+        })
+    
+    async def commit_chunk(chunk: List[tuple]):
+        # The documents are read again inside the transaction, so the counter
+        # deltas match what each write actually replaced
+        def plan(batch, *current):
+            changes = []
+            for (_, operation, doc_id, _, after, update), existing in zip(chunk, current):
+                if operation.op == BatchOpType.CREATE:
+                    batch.set(operation.collection, doc_id, after)
+                elif operation.op == BatchOpType.UPDATE:
+                    batch.update(operation.collection, doc_id, update)
+                    after = {**existing, **update} if existing else None
+                else:
+                    stage_delete(batch, operation.collection, doc_id, existing)
+                changes.append((operation.collection, existing, after))
+            stage_bulk_counter_updates(batch, changes)
+        
+        try:
+            await run_transaction([(operation.collection, doc_id) for _, operation, doc_id, *_ in chunk], plan)
+            status_code = None
+            error = None
+        except Exception as e:
+            status_code = 500
+            error = f"Write failed: {e}"
+        for index, operation, *_ in chunk:
+            if error:
+                results[index].update(_batch_error(status_code, error))
+            else:
+                results[index]["status"] = 201 if operation.op == BatchOpType.CREATE else 200
+    
+    chunks, chunk, writes = [], [], 0
+    for entry in planned:
+        if writes + _batch_writes(entry[1]) > IMPORT_CHUNK_SIZE:
+            chunks.append(chunk)
+            chunk, writes = [], 0
+        chunk.append(entry)
+        writes += _batch_writes(entry[1])
+    if chunk:
+        chunks.append(chunk)
+    await asyncio.gather(*[commit_chunk(chunk) for chunk in chunks])
+    
+    succeeded = sum(1 for result in results if "error" not in result)
+    failed = len(results) - succeeded
+    if succeeded:
+        counts: Dict[str, int] = {}
+        for result in results:
+            if "error" not in result:
+                key = f"{result['collection']}_{result['op']}d"
+                counts[key] = counts.get(key, 0) + 1
+        print(f"✅ Batch applied: {succeeded} operations ({failed} failed)")
+        await log_activity(
+            ActivityType.BATCH_APPLIED,
+            "system",
+            "system",
+            {"mode": batch_request.mode.value, "succeeded": succeeded, "failed": failed, **counts}
+        )
+    
+    content = {
+        "success": not failed,
+        "mode": batch_request.mode.value,
+        "succeeded": succeeded,
+        "failed": failed,
+        "results": results
+    }
+    if atomic and failed:
+        return FastJSONResponse(status_code=500, content=content)
+    return content
+
+# =============================
+# DELTA SYNC ENDPOINTS
+# =============================
+
+SYNC_COLLECTIONS = {
+    "users": users_repo,
+    "hospitals": hospitals_repo,
+    "slaughterhouses": slaughterhouses_repo,
+    "feedbacks": feedbacks_repo,
+}
+# updated_at is stamped before a write commits, so the newest few seconds are
+# left for the next call; otherwise a slow commit could land behind a token
+SYNC_SETTLE_SECONDS = float(os.getenv("SYNC_SETTLE_SECONDS", "5"))
+SYNC_TOMBSTONE_DAYS = int(os.getenv("SYNC_TOMBSTONE_DAYS", "30"))
+
+def _sync_time(value, stored: bool = False) -> Optional[datetime]:
+    """Timestamps as naive server-local time, the form every write path
+    stamps with datetime.now().
+
+    A client timestamp with an offset is converted to local time. A stored
+    value keeps its wall clock: Firestore hands back the naive datetimes it
+    was given labelled as UTC, without shifting them.
+    """
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value if stored else value.astimezone()
+        value = value.replace(tzinfo=None)
+    return value
+
+def encode_sync_token(collection: str, state: Dict[str, Any]) -> str:
+    payload = json.dumps({"c": collection, **state}, separators=(",", ":"), default=_encode_default)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_sync_token(since: str, collection: str) -> Dict[str, Any]:
+    """Token state: {"h": horizon, "a": last id} while a full sync is paging,
+    then {"d": [updated_at, id], "t": [deleted_at, id]} positions for deltas.
+    A plain ISO timestamp is accepted as the start of a delta sync.
+    """
+    moment = _sync_time(since)
+    if moment:
+        return {"d": [moment, ""], "t": [moment, ""]}
+    try:
+        state = json.loads(base64.urlsafe_b64decode(since + "=" * (-len(since) % 4)))
+        if "h" in state:
+            state["h"] = _sync_time(state["h"])
+        else:
+            state["d"] = [_sync_time(state["d"][0]), state["d"][1]]
+            state["t"] = [_sync_time(state["t"][0]), state["t"][1]]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    if state.pop("c", None) != collection:
+        raise HTTPException(status_code=400, detail="Sync token does not belong to this collection")
+    return state
+
+async def prune_tombstones() -> Dict[str, Any]:
+    """Drop tombstones older than the sync window (python main.py prune-tombstones)"""
+    cutoff = datetime.now() - timedelta(days=SYNC_TOMBSTONE_DAYS)
+    pruned = 0
+    for collection in SYNC_COLLECTIONS:
+        async for docs in tombstones_repo.stream_batches(
+            [("collection", "==", collection), ("deleted_at", "<", cutoff)],
+            order_by=["deleted_at"], fields=["deleted_at"], batch_size=IMPORT_CHUNK_SIZE
+        ):
+            batch = WriteBatch()
+            for doc in docs:
+                batch.delete(tombstones_repo.collection, doc["id"])
+            await batch.commit()
+            pruned += len(docs)
+    return {"pruned": pruned, "cutoff": cutoff.isoformat()}
+
+@app.get("/api/sync/{collection}")
+async def sync_collection(
+    collection: str,
+    since: Optional[str] = None,
+    page_size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
+    """Documents created or updated since a sync token, plus ids deleted since then.
+
+    Without since the whole collection is paged out (full sync). Keep calling
+    with next_token while has_more is true, then keep the last next_token for
+    the following sync. Apply deleted before changes.
+    """
+    if collection not in SYNC_COLLECTIONS:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Cannot sync '{collection}'. Available: {', '.join(SYNC_COLLECTIONS)}"
+        )
+    if not storage_ready():
+        raise HTTPException(status_code=503, detail="Firebase not initialized")
+    
+    repo = SYNC_COLLECTIONS[collection]
+    fields = LIST_FIELDS[collection]["default"] + LIST_FIELDS[collection]["extra"]
+    if since:
+        state = decode_sync_token(since, collection)
+    else:
+        state = {"h": datetime.now() - timedelta(seconds=SYNC_SETTLE_SECONDS)}
+    
+    if "h" in state:
+        # Full sync: page by id; deltas then start from the moment it began
+        docs = await repo.query(order_by=["id"], limit=page_size + 1,
+                                start_after=[state["a"]] if state.get("a") else None, fields=fields)
+        has_more = len(docs) > page_size
+        docs = docs[:page_size]
+        if has_more:
+            next_state = {"h": state["h"], "a": docs[-1]["id"]}
+        else:
+            next_state = {"d": [state["h"], ""], "t": [state["h"], ""]}
+        return FastJSONResponse({
+            "collection": collection,
+            "full_sync": True,
+            "changes": docs,
+            "deleted": [],
+            "has_more": has_more,
+            "next_token": encode_sync_token(collection, next_state)
+        })
+    
+    oldest = min(state["d"][0], state["t"][0])
+    if oldest < datetime.now() - timedelta(days=SYNC_TOMBSTONE_DAYS):
+        raise HTTPException(
+            status_code=410,
+            detail=f"Sync token is older than {SYNC_TOMBSTONE_DAYS} days; start a full sync without since"
+        )
+    
+    horizon = datetime.now() - timedelta(seconds=SYNC_SETTLE_SECONDS)
+    
+    def after(field: str, position: List[Any], filters: List[tuple]) -> Dict[str, Any]:
+        """Query arguments for one stream past a position. A position without
+        an id means everything after its moment: a plain range filter, since
+        a document cursor needs a real document id."""
+        moment, last_id = position
+        filters = filters + [(field, "<=", horizon)]
+        if last_id:
+            return {"filters": filters, "start_after": position}
+        return {"filters": filters + [(field, ">", moment)], "start_after": None}
+    
+    docs, tombstones = await asyncio.gather(
+        repo.query(order_by=["updated_at", "id"], limit=page_size + 1, fields=fields,
+                   **after("updated_at", state["d"], [])),
+        tombstones_repo.query(order_by=["deleted_at", "id"], limit=page_size + 1,
+                              **after("deleted_at", state["t"], [("collection", "==", collection)]))
+    )
+    
+    def advance(items: List[Dict[str, Any]], field: str, position: List[Any]) -> tuple:
+        """(page, next position, more pending) for one ordered stream"""
+        if len(items) > page_size:
+            items = items[:page_size]
+            return items, [_sync_time(items[-1][field], stored=True), items[-1]["id"]], True
+        # Everything up to the horizon has been seen; never move a position back
+        return items, max(position, [horizon, ""]), False
+    
+    docs, next_docs, more_docs = advance(docs, "updated_at", state["d"])
+    tombstones, next_tombstones, more_tombstones = advance(tombstones, "deleted_at", state["t"])
+    return FastJSONResponse({
+        "collection": collection,
+        "full_sync": False,
+        "changes": docs,
+        "deleted": [{"id": doc["doc_id"], "deleted_at": doc["deleted_at"]} for doc in tombstones],
+        "has_more": more_docs or more_tombstones,
+        "next_token": encode_sync_token(collection, {"d": next_docs, "t": next_tombstones})
+    })
+
+# =============================
+# SEARCH ENDPOINTS
+# =============================
+
+@app.get("/api/admin/search/status")
+async def search_status():
+    """Build state of the in-process search indexes"""
+    return {
+        "enabled": ENABLE_SEARCH_INDEX,
+        "collections": {name: index.describe() for name, index in search_indexes.items()}
+    }
+
+@app.get("/api/admin/search/{collection}")
+async def search_collection(
+    collection: str,
+    q: str = Query(..., min_length=1),
+    page_size: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    """Ranked full-text search over hospitals, slaughterhouses or users (NO AUTH)"""
+    index = ready_search_index(collection)
+    query = " ".join(tokenize(q))
+    offset = 0
+    if cursor:
+        offset, cursor_query = decode_cursor(cursor, "relevance")
+        if cursor_query != query or not isinstance(offset, int) or offset < 0:
+            raise HTTPException(status_code=400, detail="Cursor does not belong to this search")
+    
+    total, hits = index.search(query, offset, page_size)
+    next_offset = offset + len(hits)
+    return {
+        "results": hits,
+        "total": total,
+        "next_cursor": encode_cursor("relevance", [next_offset, query]) if next_offset < total else None,
+        "success": True
+    }
+
+@app.get("/api/admin/search/{collection}/typeahead")
+async def typeahead(
+    collection: str,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50)
+):
+    """Top matches for a partially typed query (NO AUTH)"""
+    index = ready_search_index(collection)
+    _, hits = index.search(q, 0, limit)
+    return {
+        "suggestions": [
+            {"id": hit["id"], "label": hit.get(index.label_field, ""), "score": hit["score"]}
+            for hit in hits
+        ],
+        "success": True
+    }
+
+# =============================
+# NEAREST FACILITY ENDPOINTS
+# =============================
+
+@app.get("/api/facilities/nearest")
+async def nearest_facilities(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    k: int = Query(10, ge=1, le=100),
+    radius_km: Optional[float] = Query(None, gt=0),
+    status: Optional[str] = "Active",
+    type: Optional[str] = Query(None, description="hospital or slaughterhouse; both when omitted")
+):
+    """k nearest facilities to a point, optionally within radius_km (NO AUTH)"""
+    collections = [c for c, facility_type in GEO_COLLECTIONS.items() if type in (None, facility_type)]
+    if not collections:
+        raise HTTPException(status_code=400, detail=f"Unknown facility type: {type}")
+    
+    indexes = [geo_indexes[collection] for collection in collections]
+    not_ready = [index.collection for index in indexes if not index.ready]
+    if not_ready:
+        raise HTTPException(status_code=503, detail=f"Geo index warming for: {', '.join(not_ready)}")
+    
+    # The ring walk is CPU work under the index lock, so keep it off the event loop
+    matches = await asyncio.gather(*(run_db(index.nearest, lat, lng, k, radius_km, status) for index in indexes))
+    results = heapq.nsmallest(k, (
+        (distance, index.facility_type, doc_id, doc)
+        for index, found in zip(indexes, matches)
+        for distance, doc_id, doc in found
+    ), key=lambda item: item[0])
+    facilities = [
+        {"id": doc_id, "type": facility_type, **doc, "distance_km": round(distance, 3)}
+        for distance, facility_type, doc_id, doc in results
+    ]
+    return {"facilities": facilities, "total": len(facilities), "success": True}
+
 # =============================
 # DEBUG ENDPOINTS
 # =============================
@@ -1992,37 +5407,339 @@ async def debug_slaughterhouse(data: dict = Body(...)):
 # ACTIVITY ENDPOINTS
 # =============================
 
-@app.get("/api/activities")
-async def get_activities(limit: int = 50):
-    """Get recent activities"""
-    activities = await get_recent_activities(limit)
-    return {
+@app.get("/api/activities", response_model=ActivityPage, dependencies=[conditional_get("activities")])
+async def get_activities(
+    response: Response,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    type: Optional[ActivityType] = None
+):
+    """Get recent activities; limit is the page size, follow next_cursor for older ones"""
+    if not storage_ready():
+        return {"activities": [], "total": 0, "count": 0, "next_cursor": None, "success": True}
+    
+    try:
+        projection = resolve_fields("activities", fields, "timestamp")
+        activity_type = type.value if type else None
+        before = None
+        if cursor:
+            timestamp, activity_id = decode_cursor(cursor, "timestamp")
+            before = (_sync_time(timestamp, stored=True) or datetime.min, activity_id)
+        filters = equality_filters(type=activity_type)
+        buffered = recent_activities.page(limit, before, activity_type)
+        if buffered is not None:
+            activities = [project_fields(activity, projection) for activity in buffered[:limit]]
+            next_cursor = None
+            if len(buffered) > limit:
+                next_cursor = encode_cursor("timestamp", [activities[-1].get("timestamp"), activities[-1]["id"]])
+        else:
+            activities, next_cursor = await fetch_page(activities_repo, "timestamp", limit, cursor,
+                                                       filters=filters, fields=projection)
+        return json_response({
+            "activities": activities,
+            "total": await activity_total(filters),
+            "count": len(activities),
+            "next_cursor": next_cursor,
+            "success": True
+        }, response)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching activities: {str(e)}")
+
+async def backfill_activity_entities() -> Dict[str, Any]:
+    """Add entity_type/entity_id and user_ids to activities logged before they
+    existed (python main.py backfill-activity-entities)"""
+    scanned = updated = 0
+    async for docs in activities_repo.stream_batches(order_by="id", batch_size=IMPORT_CHUNK_SIZE):
+        batch = WriteBatch()
+        for doc in docs:
+            update = {}
+            # Docs stamped with None (about no document) still have the key
+            if "entity_type" not in doc:
+                update["entity_type"], update["entity_id"] = activity_entity(doc.get("user_id"), doc.get("details"))
+            if "user_ids" not in doc:
+                details = doc.get("details") or {}
+                if details.get("rollup"):
+                    # Older rollups only kept a sample of their actors
+                    update["user_ids"] = [actor["user_id"] for actor in details.get("sample_actors", [])]
+                else:
+                    update["user_ids"] = [doc["user_id"]] if doc.get("user_id") else []
+            if update:
+                batch.update(activities_repo.collection, doc["id"], update)
+        await batch.commit()
+        scanned += len(docs)
+        updated += len(batch.operations)
+    return {"scanned": scanned, "updated": updated}
+
+async def activity_history(response: Response, filters: List[tuple], limit: int,
+                           cursor: Optional[str], fields: Optional[str]):
+    """One cursor page of an indexed activity history, newest first"""
+    if not storage_ready():
+        raise HTTPException(status_code=503, detail="Firebase not initialized")
+    
+    try:
+        projection = resolve_fields("activities", fields, "timestamp")
+        activities, next_cursor = await fetch_page(activities_repo, "timestamp", limit, cursor,
+                                                   filters=filters, fields=projection)
+        return json_response({
+            "activities": activities,
+            "total": await activity_total(filters),
+            "count": len(activities),
+            "next_cursor": next_cursor,
+            "success": True
+        }, response)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching activity history: {str(e)}")
+
+@app.get("/api/activities/user/{user_id}", response_model=ActivityPage, dependencies=[conditional_get("activities")])
+async def get_user_activity_history(
+    user_id: str,
+    response: Response,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Everything a user did, including rollups they are part of, newest first;
+    follow next_cursor for older entries"""
+    filters = [("user_ids", "array_contains", user_id)]
+    return await activity_history(response, filters, limit, cursor, fields)
+
+@app.get("/api/activities/entity/{entity_type}/{entity_id}", response_model=ActivityPage,
+         dependencies=[conditional_get("activities")])
+async def get_entity_activity_history(
+    entity_type: str,
+    entity_id: str,
+    response: Response,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Everything that happened to one user, hospital, slaughterhouse or feedback, newest first"""
+    if entity_type not in ENTITY_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown entity type '{entity_type}'. Available: {', '.join(ENTITY_TYPES)}"
+        )
+    filters = equality_filters(entity_type=entity_type, entity_id=entity_id)
+    return await activity_history(response, filters, limit, cursor, fields)
+
+@app.get("/api/activities/latest", response_model=ActivityPage, dependencies=[conditional_get("activities")])
+async def get_latest_activities(response: Response, limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+                                type: Optional[ActivityType] = None):
+    """Get the latest activities (10 by default)"""
+    activity_type = type.value if type else None
+    activities = await get_recent_activities(limit, activity_type)
+    return json_response({
         "activities": activities,
-        "total": len(activities),
+        "total": await activity_total(equality_filters(type=activity_type)),
+        "count": len(activities),
         "success": True
-    }
+    }, response)
+
+# =============================
+# ACTIVITY ARCHIVE
+# =============================
+
+# The activities collection is the hot partition: only the last
+# ACTIVITY_HOT_DAYS stay there, so the dashboard and /api/activities read a
+# bounded collection. Compaction moves older entries into one gzip NDJSON
+# file per month, which is kept for ACTIVITY_ARCHIVE_MONTHS (0 keeps forever).
+ACTIVITY_HOT_DAYS = int(os.getenv("ACTIVITY_HOT_DAYS", "30"))
+ACTIVITY_ARCHIVE_MONTHS = int(os.getenv("ACTIVITY_ARCHIVE_MONTHS", "24"))
+ACTIVITY_ARCHIVE_DIR = Path(os.getenv("ACTIVITY_ARCHIVE_DIR",
+                                      str(Path(__file__).parent.absolute() / "activity_archive")))
+ACTIVITY_COMPACTION_HOURS = float(os.getenv("ACTIVITY_COMPACTION_HOURS", "6"))  # 0 disables the job
+PARTITION_PATTERN = re.compile(r"^\d{4}-\d{2}$")
+
+compaction_lock = asyncio.Lock()
+compaction_task: Optional[asyncio.Task] = None
+last_compaction: Optional[Dict[str, Any]] = None
+
+def _archive_path(partition: str) -> Path:
+    return ACTIVITY_ARCHIVE_DIR / f"activities-{partition}.ndjson.gz"
+
+def _append_archive(partitions: Dict[str, List[Dict[str, Any]]]):
+    """Append one gzip member per partition; members concatenate into one valid stream"""
+    ACTIVITY_ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    for partition, docs in partitions.items():
+        with open(_archive_path(partition), "ab") as archive:
+            archive.write(gzip.compress(b"".join(encode_json(doc) + b"\n" for doc in docs)))
+            archive.flush()
+            os.fsync(archive.fileno())
+
+def _expire_archives() -> List[str]:
+    if ACTIVITY_ARCHIVE_MONTHS <= 0 or not ACTIVITY_ARCHIVE_DIR.exists():
+        return []
+    today = datetime.now()
+    month = today.year * 12 + today.month - 1 - ACTIVITY_ARCHIVE_MONTHS
+    oldest = f"{month // 12:04d}-{month % 12 + 1:02d}"
+    expired = []
+    for partition in list_archive_partitions():
+        if partition["partition"] < oldest:
+            _archive_path(partition["partition"]).unlink()
+            expired.append(partition["partition"])
+    return expired
+
+def list_archive_partitions() -> List[Dict[str, Any]]:
+    if not ACTIVITY_ARCHIVE_DIR.exists():
+        return []
+    partitions = []
+    for path in sorted(ACTIVITY_ARCHIVE_DIR.glob("activities-*.ndjson.gz")):
+        partition = path.name[len("activities-"):-len(".ndjson.gz")]
+        if PARTITION_PATTERN.match(partition):
+            partitions.append({"partition": partition, "bytes": path.stat().st_size})
+    return partitions
+
+async def compact_activities() -> Dict[str, Any]:
+    """Move activities older than the hot window into the monthly archives
+    (python main.py compact-activities).
+
+    Each chunk is fsynced to its archive file before it is deleted from the
+    collection, so a crash can at worst archive a chunk twice, never lose it.
+    """
+    global last_compaction
+    async with compaction_lock:
+        cutoff = datetime.now() - timedelta(days=ACTIVITY_HOT_DAYS)
+        started = time.monotonic()
+        moved: Dict[str, int] = {}
+        async for docs in activities_repo.stream_batches([("timestamp", "<", cutoff)], order_by="timestamp",
+                                                         batch_size=IMPORT_CHUNK_SIZE):
+            partitions: Dict[str, List[Dict[str, Any]]] = {}
+            for doc in docs:
+                partitions.setdefault(doc.get("partition") or activity_partition(doc.get("timestamp")), []).append(doc)
+            await run_db(_append_archive, partitions)
+            batch = WriteBatch()
+            for doc in docs:
+                batch.delete(activities_repo.collection, doc["id"])
+            await batch.commit()
+            for partition, partition_docs in partitions.items():
+                moved[partition] = moved.get(partition, 0) + len(partition_docs)
+        expired = await run_db(_expire_archives)
+        last_compaction = {
+            "archived": sum(moved.values()),
+            "partitions": moved,
+            "expired_partitions": expired,
+            "cutoff": cutoff.isoformat(),
+            "seconds": round(time.monotonic() - started, 3),
+            "finished_at": datetime.now().isoformat()
+        }
+    if moved:
+        print(f"✅ Archived {last_compaction['archived']} activities into {', '.join(sorted(moved))}")
+    return last_compaction
+
+async def run_activity_compaction():
+    while True:
+        try:
+            await compact_activities()
+        except Exception as e:
+            print(f"❌ Activity compaction failed: {e}")
+        await asyncio.sleep(ACTIVITY_COMPACTION_HOURS * 3600)
 
-@app.get("/api/activities/latest")
-async def get_latest_activities():
-    """Get latest 10 activities"""
-    activities = await get_recent_activities(10)
+@app.on_event("startup")
+async def start_activity_compaction():
+    global compaction_task
+    if ACTIVITY_COMPACTION_HOURS > 0 and storage_ready():
+        compaction_task = asyncio.create_task(run_activity_compaction())
+
+@app.on_event("shutdown")
+async def stop_activity_compaction():
+    if compaction_task is not None:
+        compaction_task.cancel()
+
+@app.get("/api/admin/activities/archive")
+async def activity_archive_status():
+    """Archived activity partitions and the retention policy (NO AUTH)"""
     return {
-        "activities": activities,
-        "total": len(activities),
+        "hot_days": ACTIVITY_HOT_DAYS,
+        "archive_months": ACTIVITY_ARCHIVE_MONTHS,
+        "compaction_hours": ACTIVITY_COMPACTION_HOURS,
+        "partitions": await run_db(list_archive_partitions),
+        "last_compaction": last_compaction,
         "success": True
     }
 
+@app.post("/api/admin/activities/archive/compact")
+async def trigger_activity_compaction():
+    """Run the archive compaction now (NO AUTH)"""
+    if not storage_ready():
+        raise HTTPException(status_code=503, detail="Firebase not initialized")
+    try:
+        return {**await compact_activities(), "success": True}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error compacting activities: {str(e)}")
+
+@app.get("/api/admin/activities/archive/{partition}")
+async def read_activity_archive(partition: str, type: Optional[ActivityType] = None):
+    """Stream one archived month as NDJSON, optionally only one activity type (NO AUTH)"""
+    if not PARTITION_PATTERN.match(partition):
+        raise HTTPException(status_code=400, detail="Partition must look like YYYY-MM")
+    path = _archive_path(partition)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail=f"No archived activities for {partition}")
+    
+    def body():
+        # Runs on Starlette's thread pool; decompresses one line at a time
+        with gzip.open(path, "rb") as archive:
+            for line in archive:
+                if type is None or json.loads(line).get("type") == type.value:
+                    yield line
+    
+    return StreamingResponse(
+        body(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="activities-{partition}.ndjson"'}
+    )
+
 # =============================
 # APPLICATION STARTUP
 # =============================
 
+def export_firestore_indexes(path: Optional[str] = None) -> int:
+    """python main.py export-indexes [path]: regenerate firestore.indexes.json"""
+    content = json.dumps(firestore_index_definitions(), indent=2) + "\n"
+    if path:
+        Path(path).write_text(content)
+        print(f"✅ Wrote {path}")
+    else:
+        print(content, end="")
+    return 0
+
+STATS_COMMANDS = {
+    "rebuild-stats": rebuild_dashboard_counters,
+    "verify-stats": verify_dashboard_counters,
+    "rebuild-facets": rebuild_facet_counts,
+    "verify-facets": verify_facet_counts,
+    "prune-tombstones": prune_tombstones,
+    "compact-activities": compact_activities,
+    "backfill-activity-entities": backfill_activity_entities,
+}
+
+def run_stats_command(command: str) -> int:
+    """Run a maintenance command: python main.py <command> for any key of STATS_COMMANDS"""
+    if not storage_ready():
+        print("❌ Storage not initialized")
+        return 1
+    result = asyncio.run(STATS_COMMANDS[command]())
+    print(json.dumps(result, indent=2, default=str))
+    return 0 if result.get("consistent", True) else 2
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in STATS_COMMANDS:
+        sys.exit(run_stats_command(sys.argv[1]))
+    if len(sys.argv) > 1 and sys.argv[1] == "export-indexes":
+        sys.exit(export_firestore_indexes(sys.argv[2] if len(sys.argv) > 2 else None))
+    
     print("=" * 80)
     print("🚀 LivestockSync Admin Backend API v5.0 (ENHANCED REAL-TIME VERSION)")
     print("=" * 80)
     print(f"📍 Server URL: http://localhost:8000")
     print(f"📚 API Docs: http://localhost:8000/docs")
     print(f"🔥 Firebase: {'✅ Connected' if firebase_initialized else '❌ Not Initialized'}")
+    print(f"🗄️  Storage: {store.name if store else '❌ Not Initialized'}")
     print(f"🔌 WebSocket: /ws/dashboard")
     print("=" * 80)
     print("\n✨ ENHANCED FEATURES:")
@@ -2061,6 +5778,12 @@ if __name__ == "__main__":
     print("   DELETE /api/admin/slaughterhouses/{id} - Delete slaughterhouse")
     print("   DELETE /api/admin/users/{id} - Delete user")
     print("   PUT  /api/admin/users/{id} - Update user")
+    print("   PUT  /api/admin/feedback/{id}/status - Update feedback status")
+    print("\n🧮 Maintenance Commands:")
+    print("   python main.py rebuild-stats - Recount and rewrite dashboard counters")
+    print("   python main.py verify-stats - Compare dashboard counters with a recount")
+    print("   python main.py rebuild-facets / verify-facets - Same for the facet counters")
+    print("   python main.py export-indexes [path] - Regenerate firestore.indexes.json")
     print("\n🔔 Real-time Notifications:")
     print("   ✅ hospital_added - When hospital is added")
     print("   ✅ hospital_updated - When hospital is updated")
@@ -2078,10 +5801,11 @@ if __name__ == "__main__":
     print("   ✅ two_factor_disabled - When 2FA is disabled")
     print("   ✅ password_reset - When password is reset")
     
-    if not firebase_initialized:
+    if not storage_ready():
         print("\n⚠️  IMPORTANT: Firebase not initialized!")
         print("   Please add 'serviceAccountKey.json' to the project directory")
         print("   Download it from Firebase Console > Project Settings > Service Accounts")
+        print("   or run with STORAGE_BACKEND=sqlite for local storage")
     
     print("=" * 80)
     
@@ -0,0 +1,30 @@
+"""Point the API at a throwaway SQLite database before main is imported.
+
+main reads its configuration at import time, and its shutdown hook stops the
+database executor, so one TestClient is shared by the whole session.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+_tmp = tempfile.mkdtemp(prefix="livestocksync-tests-")
+os.environ["STORAGE_BACKEND"] = "sqlite"
+os.environ["SQLITE_DB_PATH"] = os.path.join(_tmp, "test.db")
+os.environ["ACTIVITY_ARCHIVE_DIR"] = os.path.join(_tmp, "archive")
+os.environ["ACTIVITY_FLUSH_INTERVAL"] = "0.05"
+os.environ["ACTIVITY_ROLLUP_WINDOWS"] = "user_login=1,settings_updated=1"
+os.environ["SYNC_SETTLE_SECONDS"] = "0"
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "api"))
+
+import main  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    with TestClient(main.app) as test_client:
+        yield test_client
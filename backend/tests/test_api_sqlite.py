@@ -0,0 +1,190 @@
+"""Drive the API end to end through TestClient against the SQLite backend."""
+import time
+import uuid
+
+import main
+
+
+def _ok(response, status=200):
+    assert response.status_code == status, response.text
+    return response.json()
+
+
+def _signup(client, role="veterinarian"):
+    email = f"{uuid.uuid4().hex[:10]}@example.com"
+    _ok(client.post("/api/auth/signup", json={
+        "email": email, "password": "secret1", "full_name": f"Tester {email[:4]}", "role": role
+    }))
+    return email
+
+
+def _login(client, email):
+    return _ok(client.post("/api/auth/login", json={"email": email, "password": "secret1"}))["user"]["id"]
+
+
+def _add_hospital(client, name=None, **fields):
+    return _ok(client.post("/api/admin/hospitals", json={"name": name or f"Hospital {uuid.uuid4().hex[:6]}",
+                                                          "address": "Main road", **fields}))["id"]
+
+
+def _consistent(client):
+    dashboard = client.portal.call(main.verify_dashboard_counters)
+    facets = client.portal.call(main.verify_facet_counts)
+    assert dashboard["consistent"], dashboard["drift"]
+    assert facets["consistent"], facets["drift"]
+
+
+def _wait_for(fetch, predicate, timeout=5.0):
+    """Activities are written behind the request, so poll until they land"""
+    deadline = time.monotonic() + timeout
+    while True:
+        result = fetch()
+        if predicate(result) or time.monotonic() > deadline:
+            return result
+        time.sleep(0.05)
+
+
+def _hospital_ids(client):
+    return {hospital["id"] for hospital in _ok(client.get("/api/admin/hospitals?page_size=500"))["hospitals"]}
+
+
+def test_hospital_crud(client):
+    hospital_id = _add_hospital(client, "City Vet", services="Surgery, Vaccination")
+    assert hospital_id in _hospital_ids(client)
+
+    _ok(client.put(f"/api/admin/hospitals/{hospital_id}", json={"status": "Inactive"}))
+    inactive = _ok(client.get("/api/admin/hospitals?status=Inactive&page_size=500"))["hospitals"]
+    assert hospital_id in {hospital["id"] for hospital in inactive}
+
+    _ok(client.delete(f"/api/admin/hospitals/{hospital_id}"))
+    assert hospital_id not in _hospital_ids(client)
+    assert client.put(f"/api/admin/hospitals/{hospital_id}", json={"status": "Active"}).status_code == 404
+
+
+def test_user_update_and_delete(client):
+    user_id = _login(client, _signup(client))
+    _ok(client.put(f"/api/admin/users/{user_id}", json={"status": "Inactive"}))
+    users = _ok(client.get("/api/admin/users?status=Inactive&page_size=500"))["users"]
+    assert user_id in {user["id"] for user in users}
+    assert all("password" not in user for user in users)
+
+    _ok(client.delete(f"/api/admin/users/{user_id}"))
+    assert client.delete(f"/api/admin/users/{user_id}").status_code == 404
+
+
+def _counters(client):
+    # The stats endpoint serves a cached snapshot; read the counters themselves
+    return client.portal.call(main.dashboard_counters.read)
+
+
+def test_counters_follow_writes(client):
+    before = _counters(client)
+    hospital_id = _add_hospital(client)
+    _signup(client, "slaughterhouse")
+    after = _counters(client)
+    assert after.get("total_hospitals", 0) == before.get("total_hospitals", 0) + 1
+    assert after.get("total_users", 0) == before.get("total_users", 0) + 1
+    _consistent(client)
+
+    _ok(client.put(f"/api/admin/hospitals/{hospital_id}", json={"status": "Inactive"}))
+    _ok(client.delete(f"/api/admin/hospitals/{hospital_id}"))
+    _ok(client.delete(f"/api/admin/hospitals/{hospital_id}"))  # already gone: counters must not move again
+    assert _counters(client).get("total_hospitals", 0) == before.get("total_hospitals", 0)
+    _consistent(client)
+
+
+def test_pagination_walks_every_document(client):
+    for _ in range(5):
+        _add_hospital(client)
+    first = _ok(client.get("/api/admin/hospitals?page_size=2"))
+    assert first["count"] == 2
+    assert first["total"] == _ok(client.get("/api/admin/hospitals/count"))["total_hospitals"]
+
+    seen, page = [], first
+    while True:
+        seen.extend(hospital["id"] for hospital in page["hospitals"])
+        if not page["next_cursor"]:
+            break
+        page = _ok(client.get("/api/admin/hospitals", params={"page_size": 2, "cursor": page["next_cursor"]}))
+    assert len(seen) == len(set(seen)) == first["total"]
+
+
+def test_sync_full_then_delta(client):
+    def sync(since=None):
+        return _ok(client.get("/api/sync/hospitals", params={"since": since, "page_size": 2} if since
+                              else {"page_size": 2}))
+
+    page = sync()
+    assert page["full_sync"]
+    while page["has_more"]:
+        page = sync(page["next_token"])
+    token = page["next_token"]
+
+    time.sleep(0.01)
+    hospital_id = _add_hospital(client, "Delta Vet")
+    delta = sync(token)
+    assert [doc["id"] for doc in delta["changes"]] == [hospital_id]
+    assert delta["deleted"] == []
+
+    _ok(client.delete(f"/api/admin/hospitals/{hospital_id}"))
+    delta = sync(delta["next_token"])
+    assert delta["changes"] == []
+    assert [tombstone["id"] for tombstone in delta["deleted"]] == [hospital_id]
+    assert sync(delta["next_token"])["deleted"] == []
+
+    assert client.get("/api/sync/hospitals", params={"since": "garbage"}).status_code == 400
+
+
+def test_batch_modes(client):
+    hospital_id = _add_hospital(client)
+    result = _ok(client.post("/api/admin/batch", json={"mode": "best_effort", "operations": [
+        {"op": "create", "collection": "hospitals", "data": {"name": "Batch Vet"}},
+        {"op": "update", "collection": "hospitals", "id": hospital_id, "data": {"status": "Inactive"}},
+        {"op": "update", "collection": "hospitals", "id": "missing", "data": {"status": "Inactive"}},
+    ]}))
+    assert (result["succeeded"], result["failed"]) == (2, 1)
+    assert [entry.get("status") for entry in result["results"]] == [201, 200, 404]
+    _consistent(client)
+
+    response = client.post("/api/admin/batch", json={"mode": "atomic", "operations": [
+        {"op": "delete", "collection": "hospitals", "id": hospital_id},
+        {"op": "delete", "collection": "hospitals", "id": "missing"},
+    ]})
+    assert response.status_code == 404
+    assert hospital_id in _hospital_ids(client)
+
+    _ok(client.post("/api/admin/batch", json={"operations": [
+        {"op": "delete", "collection": "hospitals", "id": hospital_id}
+    ]}))
+    assert hospital_id not in _hospital_ids(client)
+    _consistent(client)
+
+
+def test_activities_roll_up_per_type(client):
+    emails = [_signup(client) for _ in range(3)]
+    user_ids = [_login(client, email) for email in emails]
+
+    def history(user_id):
+        return _ok(client.get(f"/api/activities/user/{user_id}"))["activities"]
+
+    def logins(activities):
+        return [activity for activity in activities if activity["type"] == "user_login"]
+
+    # The last login is folded into a rollup that is written once the window closes
+    activities = _wait_for(lambda: history(user_ids[-1]), lambda found: logins(found))
+    rollups = [activity for activity in logins(activities) if activity["details"].get("rollup")]
+    assert rollups, activities
+    assert rollups[0]["details"]["count"] >= 2
+    assert any(actor["user_id"] == user_ids[-1] for actor in rollups[0]["details"]["sample_actors"])
+
+    listed = _ok(client.get("/api/activities?type=user_login&limit=500"))
+    assert listed["total"] >= listed["count"] >= 1
+
+
+def test_list_endpoints_without_storage(client, monkeypatch):
+    monkeypatch.setattr(main, "store", None)
+    for path, key in [("/api/admin/users", "users"), ("/api/admin/hospitals", "hospitals"),
+                      ("/api/admin/slaughterhouses", "slaughterhouses"), ("/api/admin/feedback", "feedbacks"),
+                      ("/api/activities", "activities")]:
+        body = _ok(client.get(path))
+        assert body[key] == [] and body["count"] == 0
@@ -0,0 +1,88 @@
+"""Build Firestore queries offline so query-construction errors surface
+without a live project (the SQLite backend never exercises this code)."""
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import firestore as gcloud_firestore
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "api"))
+
+import main  # noqa: E402
+
+
+@pytest.fixture
+def backend():
+    client = gcloud_firestore.Client(project="test-project", credentials=AnonymousCredentials())
+    return main.FirestoreBackend(client)
+
+
+def _orders(query):
+    return [(order.field.field_path, order.direction) for order in query._to_protobuf().order_by]
+
+
+def test_page_query_orders_by_document_id(backend):
+    query = backend._query("users", order_by=["created_at", "id"], descending=True, limit=5,
+                           start_after=[datetime(2026, 1, 1), "user-1"])
+    assert [field for field, _ in _orders(query)] == ["created_at", "__name__"]
+    cursor = query._to_protobuf().start_at
+    assert cursor.values[1].reference_value.endswith("/documents/users/user-1")
+
+
+def test_id_only_order(backend):
+    query = backend._query("hospitals", order_by="id", start_after=["h-1"], fields=["name"])
+    assert [field for field, _ in _orders(query)] == ["__name__"]
+
+
+class _Snapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+def _capture_stream(monkeypatch, docs):
+    captured = []
+
+    def fake_stream(query, *args, **kwargs):
+        captured.append(query)
+        return iter(docs)
+
+    monkeypatch.setattr(gcloud_firestore.Query, "stream", fake_stream)
+    return captured
+
+
+def test_export_streams_in_document_id_order(backend, monkeypatch):
+    captured = _capture_stream(monkeypatch, [_Snapshot("h-1", {"name": "City Vet"})])
+    # Same arguments Repository.stream_batches passes for an unfiltered export
+    rows = list(backend.stream("hospitals", [], "id", False, ["name", "created_at"]))
+    assert rows == [{"name": "City Vet", "id": "h-1"}]
+    assert [field for field, _ in _orders(captured[0])] == ["__name__"]
+
+
+def test_export_date_range_orders_on_date_field(backend, monkeypatch):
+    captured = _capture_stream(monkeypatch, [])
+    filters = [("created_at", ">", datetime(2026, 1, 1)), ("created_at", "<", datetime(2026, 2, 1))]
+    assert list(backend.stream("hospitals", filters, "created_at", False, ["name"])) == []
+    assert [field for field, _ in _orders(captured[0])] == ["created_at"]
+
+
+def test_delta_sync_starts_with_range_filter(backend, monkeypatch):
+    captured = _capture_stream(monkeypatch, [])
+    monkeypatch.setattr(main, "store", backend)
+    since = (datetime.now() - timedelta(hours=1)).isoformat()
+    response = asyncio.run(main.sync_collection("hospitals", since=since, page_size=10))
+    assert response.status_code == 200
+    assert len(captured) == 2
+    for query in captured:
+        protobuf = query._to_protobuf()
+        # No document cursor: an empty id would be an invalid __name__ reference
+        assert not protobuf.start_at.values
+        ranges = [f.field_filter.op for f in protobuf.where.composite_filter.filters
+                  if f.field_filter.field.field_path in ("updated_at", "deleted_at")]
+        assert sorted(op.name for op in ranges) == ["GREATER_THAN", "LESS_THAN_OR_EQUAL"]
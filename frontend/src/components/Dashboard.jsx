@@ -90,7 +90,7 @@ const Dashboard = () => {
       const [usersRes, hospitalsRes, slaughterhousesRes, dashboardRes] = await Promise.all([
         fetch(`${API_URL}/api/admin/users/count`),
         fetch(`${API_URL}/api/admin/hospitals/count`),
-        fetch(`${API_URL}/api/admin/slaughterhouses`), // Changed from /count to regular endpoint
+        fetch(`${API_URL}/api/admin/slaughterhouses/count`),
         fetch(`${API_URL}/api/admin/dashboard/stats`) // Added dashboard stats endpoint
       ]);
 
@@ -124,11 +124,9 @@ const Dashboard = () => {
         totalHospitals = hospitalsData.total_hospitals || 0;
       }
       
-      // Process slaughterhouses - FIXED
-      if (slaughterhousesRes.ok) {
+      if (totalSlaughterhouses === 0 && slaughterhousesRes.ok) {
         const slaughterhousesData = await slaughterhousesRes.json();
-        // Extract count from the response
-        totalSlaughterhouses = slaughterhousesData.total || slaughterhousesData.slaughterhouses?.length || 0;
+        totalSlaughterhouses = slaughterhousesData.total_slaughterhouses || 0;
       }
       
       // Update stats
@@ -172,17 +170,17 @@ const Dashboard = () => {
       ]);
       
       // User distribution calculation - FIXED
-      // Fetch actual user distribution from API if possible
+      // Role counts come from the facet counters, so they cover every user
+      // rather than just the first page of the user list
       try {
-        const usersListRes = await fetch(`${API_URL}/api/admin/users`);
-        if (usersListRes.ok) {
-          const usersListData = await usersListRes.json();
-          const allUsers = usersListData.users || [];
+        const facetsRes = await fetch(`${API_URL}/api/admin/facets?collection=users`);
+        if (facetsRes.ok) {
+          const facetsData = await facetsRes.json();
+          const roles = facetsData.facets?.users?.role || {};
           
-          // Count actual users by role
-          const farmersCount = allUsers.filter(u => u.role === 'farmer').length;
-          const vetsCount = allUsers.filter(u => u.role === 'veterinarian').length;
-          const slaughterCount = allUsers.filter(u => u.role === 'slaughterhouse').length;
+          const farmersCount = roles.farmer || 0;
+          const vetsCount = roles.veterinarian || 0;
+          const slaughterCount = roles.slaughterhouse || 0;
           
           setUserDistribution([
             { 
@@ -24,16 +24,24 @@ const HospitalManagement = ({ onAddActivity }) => {
   const fetchHospitals = async () => {
     try {
       setLoading(true);
-      const response = await fetch(`${API_URL}/api/admin/hospitals`, {
-        headers: {
-          'Content-Type': 'application/json'
-        }
-      });
-
-      if (response.ok) {
+      // The list is paginated; follow next_cursor until every page is loaded
+      const allHospitals = [];
+      let cursor = null;
+      do {
+        const params = new URLSearchParams({ page_size: '100' });
+        if (cursor) params.set('cursor', cursor);
+        const response = await fetch(`${API_URL}/api/admin/hospitals?${params}`, {
+          headers: {
+            'Content-Type': 'application/json'
+          }
+        });
+        if (!response.ok) break;
         const data = await response.json();
-        setHospitals(data.hospitals || []);
-      }
+        allHospitals.push(...(data.hospitals || []));
+        cursor = data.next_cursor;
+      } while (cursor);
+
+      setHospitals(allHospitals);
     } catch (err) {
       console.error('Error fetching hospitals:', err);
     } finally {
@@ -26,18 +26,27 @@ const SlaughterhouseManagement = ({ onAddActivity }) => {
     try {
       setLoading(true);
       
-      const response = await fetch(`${API_URL}/api/admin/slaughterhouses`, {
-        headers: {
-          'Content-Type': 'application/json'
+      // The list is paginated; follow next_cursor until every page is loaded
+      const allSlaughterhouses = [];
+      let cursor = null;
+      do {
+        const params = new URLSearchParams({ page_size: '100' });
+        if (cursor) params.set('cursor', cursor);
+        const response = await fetch(`${API_URL}/api/admin/slaughterhouses?${params}`, {
+          headers: {
+            'Content-Type': 'application/json'
+          }
+        });
+        if (!response.ok) {
+          console.error('Failed to fetch slaughterhouses');
+          break;
         }
-      });
-
-      if (response.ok) {
         const data = await response.json();
-        setSlaughterhouses(data.slaughterhouses || []);
-      } else {
-        console.error('Failed to fetch slaughterhouses');
-      }
+        allSlaughterhouses.push(...(data.slaughterhouses || []));
+        cursor = data.next_cursor;
+      } while (cursor);
+
+      setSlaughterhouses(allSlaughterhouses);
     } catch (err) {
       console.error('Error fetching slaughterhouses:', err);
     } finally {